@@ -1,5 +1,4 @@
-import yaml
-from typing import List, Dict, Any
+from typing import Dict
 from pydantic import BaseModel
 
 class ServiceConfig(BaseModel):
@@ -7,11 +6,6 @@ class ServiceConfig(BaseModel):
     name: str
     url: str
     entropy_endpoints: Dict[str, str]
-
-def load_service_config(path: str = "services.yml") -> List[ServiceConfig]:
-    """Loads the service configuration from a YAML file."""
-    with open(path, "r") as f:
-        config_data = yaml.safe_load(f)
-    
-    services = config_data.get("services", [])
-    return [ServiceConfig(**service) for service in services]
+    # Whether the service's replicas subscribe to the entropy push channel;
+    # the others are always reached through their entropy endpoints
+    push: bool = False
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as aioredis
+import structlog
+from prometheus_client import Counter
+
+from .config import ServiceConfig
+
+logger = structlog.get_logger()
+
+# Must match the channel the services subscribe to
+ENTROPY_CHANNEL = "entropy:config"
+
+ENTROPY_PUBLISHED = Counter(
+    "entropy_config_published_total",
+    "Versioned entropy configurations published to service replicas",
+    ["service"]
+)
+
+
+class EntropyPublisher:
+    """
+    Pushes versioned entropy configurations to every replica of a service.
+
+    Each publish carries the service's full entropy state and a per-service
+    version from a Redis counter, so replicas apply the state in one step and
+    ignore anything older than what they have. The latest message is also kept
+    under a snapshot key that replicas read when they (re)subscribe.
+    """
+
+    def __init__(self, client: aioredis.Redis):
+        self.client = client
+
+    @staticmethod
+    def _snapshot_key(service_id: str) -> str:
+        return f"{ENTROPY_CHANNEL}:{service_id}"
+
+    async def publish(self, service_id: str, state: Dict[str, Any]) -> int:
+        """Publishes a service's entropy state and returns its version."""
+        # The services expect "error_rate"; older scenario files still say "errors"
+        state = {("error_rate" if key == "errors" else key): value for key, value in state.items()}
+        version = await self.client.incr(f"{self._snapshot_key(service_id)}:version")
+        message = json.dumps({
+            "service_id": service_id,
+            "version": version,
+            "state": state,
+            "published_at": time.time(),
+        })
+
+        snapshot_key = self._snapshot_key(service_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(snapshot_key)
+                    current = await pipe.get(snapshot_key)
+                    pipe.multi()
+                    # A concurrent publish may already have stored a newer version
+                    if current is None or json.loads(current)["version"] < version:
+                        pipe.set(snapshot_key, message)
+                    pipe.publish(ENTROPY_CHANNEL, message)
+                    await pipe.execute()
+                    break
+                except aioredis.WatchError:
+                    continue
+
+        ENTROPY_PUBLISHED.labels(service=service_id).inc()
+        logger.info("Published entropy configuration", service_id=service_id, version=version, state=state)
+        return version
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def uses_push(publisher: Optional[EntropyPublisher], service: ServiceConfig) -> bool:
+    """Whether changes for `service` are published rather than POSTed to its entropy endpoints."""
+    return publisher is not None and service.push
+
+
+def create_entropy_publisher() -> Optional[EntropyPublisher]:
+    """
+    Builds a publisher when ENTROPY_PUSH_URL is set.
+
+    Without one, the engine falls back to POSTing each change to the single
+    instance behind a service's URL.
+    """
+    url = os.environ.get("ENTROPY_PUSH_URL")
+    if not url:
+        return None
+    return EntropyPublisher(aioredis.Redis.from_url(url))
+
+
+async def publish_reset(publisher: EntropyPublisher, config: List[ServiceConfig]) -> Dict[str, Any]:
+    """Publishes a zero entropy state to every service in `config`; reports like reset_services."""
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(publisher.publish(service.id, {"latency": 0, "error_rate": 0}) for service in config),
+        return_exceptions=True,
+    )
+    results: Dict[str, Dict[str, Any]] = {}
+    for service, outcome in zip(config, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error("Failed to publish entropy reset", service_id=service.id, error=str(outcome))
+            results[service.id] = {"push": {"status": "failed", "error": str(outcome)}}
+        else:
+            results[service.id] = {"push": {"status": "ok", "version": outcome}}
+    return {
+        "success": all(r["push"]["status"] == "ok" for r in results.values()),
+        "duration_seconds": round(time.perf_counter() - start, 3),
+        "services": results,
+    }
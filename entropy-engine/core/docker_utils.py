@@ -1,44 +1,191 @@
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
 import docker
+import structlog
 from docker.errors import NotFound
+from prometheus_client import Counter, Histogram
+
+logger = structlog.get_logger()
+
+ACTIONS = ("set_env", "set_resources", "disconnect_network", "connect_network", "stop", "start")
+
+DOCKER_OPERATION_DURATION = Histogram(
+    "docker_operation_duration_seconds",
+    "Time spent in Docker daemon calls, including executor queueing",
+    ["operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+DOCKER_HANDLE_CACHE = Counter(
+    "docker_handle_cache_requests_total",
+    "Container and network handle lookups by result",
+    ["kind", "result"]
+)
+
+
+class ContainerNotFound(Exception):
+    """Raised when a service has no running container."""
+
+
+class DockerController:
+    """
+    Runs Docker SDK calls on a thread pool so they never block the event loop.
+
+    Container and network handles are cached for `handle_ttl` seconds. An
+    operation that fails with NotFound (e.g. the container was recreated) drops
+    the cached handle and is retried once with a fresh lookup. The Docker client
+    itself is created on first use, so importing the engine doesn't need a
+    reachable daemon.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any] = docker.from_env,
+        network_name: str = "sre-masterclass_default",
+        handle_ttl: float = 30.0,
+        max_workers: int = 8,
+        clock=time.monotonic,
+    ):
+        self._client_factory = client_factory
+        self._client = None
+        self.network_name = network_name
+        self.handle_ttl = handle_ttl
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="docker")
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._containers: Dict[str, Tuple[Any, float]] = {}
+        self._networks: Dict[str, Tuple[Any, float]] = {}
+
+    async def _run(self, operation: str, fn: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            DOCKER_OPERATION_DURATION.labels(operation=operation).observe(time.perf_counter() - start)
+
+    async def _get_client(self):
+        if self._client is None:
+            self._client = await self._run("connect", self._client_factory)
+        return self._client
+
+    async def _cached(self, kind: str, cache: Dict[str, Tuple[Any, float]], key: str, lookup: Callable):
+        entry = cache.get(key)
+        if entry is not None and self._clock() < entry[1]:
+            DOCKER_HANDLE_CACHE.labels(kind=kind, result="hit").inc()
+            return entry[0]
+        DOCKER_HANDLE_CACHE.labels(kind=kind, result="miss").inc()
+        handle = await self._run(f"get_{kind}", lookup, key)
+        cache[key] = (handle, self._clock() + self.handle_ttl)
+        return handle
+
+    async def get_container(self, service_id: str):
+        """Gets a container by its name, or None if it doesn't exist."""
+        client = await self._get_client()
+        try:
+            return await self._cached("container", self._containers, service_id, client.containers.get)
+        except NotFound:
+            return None
+
+    async def get_network(self, name: Optional[str] = None):
+        client = await self._get_client()
+        return await self._cached("network", self._networks, name or self.network_name, client.networks.get)
+
+    def invalidate(self, service_id: Optional[str] = None) -> None:
+        """Drops cached handles for one container, or for everything."""
+        if service_id is None:
+            self._containers.clear()
+            self._networks.clear()
+        else:
+            self._containers.pop(service_id, None)
+
+    async def _apply(self, container, action: str, params: Dict[str, Any]) -> None:
+        if action == "set_env":
+            # Changing the environment of a running container needs it to be
+            # recreated; for now the request is only logged.
+            for key, value in params.items():
+                logger.info("Setting env var", container=container.name, key=key, value=value)
+        elif action == "set_resources":
+            await self._run(
+                "update", container.update,
+                mem_limit=params.get("mem_limit"), cpu_shares=params.get("cpu_shares"),
+            )
+        elif action == "disconnect_network":
+            logger.info("Disconnecting container from network", container=container.name)
+            network = await self.get_network(params.get("network"))
+            await self._run("disconnect_network", network.disconnect, container)
+        elif action == "connect_network":
+            logger.info("Connecting container to network", container=container.name)
+            network = await self.get_network(params.get("network"))
+            await self._run("connect_network", network.connect, container)
+        elif action == "stop":
+            logger.info("Stopping container", container=container.name)
+            await self._run("stop", container.stop)
+        elif action == "start":
+            logger.info("Starting container", container=container.name)
+            await self._run("start", container.start)
+        else:
+            raise ValueError(f"Invalid docker action: {action}")
+
+    async def perform(self, service_id: str, action: str, params: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Performs `action` on the container of `service_id`.
+
+        Raises ContainerNotFound if there is no such container and ValueError
+        for an unknown action.
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"Invalid docker action: {action}")
+        params = params or {}
+        async with self._semaphore:
+            for attempt in range(2):
+                container = await self.get_container(service_id)
+                if container is None:
+                    raise ContainerNotFound(service_id)
+                try:
+                    await self._apply(container, action, params)
+                    return
+                except NotFound:
+                    # The cached handle (or network) went away; look it up again once
+                    self.invalidate(service_id)
+                    self._networks.clear()
+                    if attempt == 1:
+                        raise ContainerNotFound(service_id)
+
+    async def perform_many(
+        self, service_ids: List[str], action: str, params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Performs the same action on many containers concurrently and reports the outcome of each."""
+        if action not in ACTIONS:
+            raise ValueError(f"Invalid docker action: {action}")
+        outcomes = await asyncio.gather(
+            *(self.perform(service_id, action, params) for service_id in service_ids),
+            return_exceptions=True,
+        )
+        results = {}
+        for service_id, outcome in zip(service_ids, outcomes):
+            if outcome is None:
+                results[service_id] = {"status": "ok"}
+            elif isinstance(outcome, ContainerNotFound):
+                results[service_id] = {"status": "not_found"}
+            else:
+                logger.error("Docker action failed", service_id=service_id, action=action, error=str(outcome))
+                results[service_id] = {"status": "failed", "error": str(outcome)}
+        return results
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
 
-client = docker.from_env()
-
-def get_container(service_id):
-    """Gets a container by its name."""
-    try:
-        return client.containers.get(service_id)
-    except NotFound:
-        return None
-
-def set_environment_variable(container, key, value):
-    """Sets an environment variable in a running container."""
-    # This is a simplified example. In a real-world scenario, you might
-    # need to recreate the container with the new environment variable.
-    # For this example, we'll just log the action.
-    print(f"Setting env var {key}={value} for container {container.name}")
-
-def update_resource_limits(container, mem_limit=None, cpu_shares=None):
-    """Updates the resource limits of a running container."""
-    container.update(mem_limit=mem_limit, cpu_shares=cpu_shares)
-
-def disconnect_network(container):
-    """Disconnects a container from the network."""
-    # This is a simplified example. In a real-world scenario, you would
-    # need to handle multiple networks and more complex scenarios.
-    print(f"Disconnecting container {container.name} from network")
-    client.networks.get("sre-masterclass_default").disconnect(container)
-
-def connect_network(container):
-    """Connects a container to the network."""
-    print(f"Connecting container {container.name} to network")
-    client.networks.get("sre-masterclass_default").connect(container)
-
-def stop_container(container):
-    """Stops a container."""
-    print(f"Stopping container {container.name}")
-    container.stop()
-
-def start_container(container):
-    """Starts a container."""
-    print(f"Starting container {container.name}")
-    container.start()
+docker_controller = DockerController(
+    network_name=os.environ.get("DOCKER_NETWORK_NAME", "sre-masterclass_default"),
+    handle_ttl=float(os.environ.get("DOCKER_HANDLE_TTL_SECONDS", "30")),
+    max_workers=int(os.environ.get("DOCKER_EXECUTOR_WORKERS", "8")),
+)
@@ -0,0 +1,96 @@
+import os
+import time
+from typing import Optional
+
+import httpx
+from prometheus_client import Counter, Gauge, Histogram
+
+HTTP_CLIENT_IN_FLIGHT = Gauge(
+    "http_client_requests_in_flight",
+    "Outgoing HTTP requests currently in flight",
+    ["client"],
+    multiprocess_mode="livesum"
+)
+HTTP_CLIENT_POOL_WAIT = Histogram(
+    "http_client_pool_wait_seconds",
+    "Time an outgoing request waited for a pooled connection",
+    ["client"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+HTTP_CLIENT_CONNECTIONS = Counter(
+    "http_client_connections_total",
+    "Outgoing requests by whether they reused a kept-alive connection",
+    ["client", "reused"]
+)
+
+# The first of these events marks the moment a request got hold of a connection
+_NEW_CONNECTION_EVENTS = ("connection.connect_tcp.started", "connection.connect_unix_socket.started")
+_SEND_EVENTS = ("http11.send_request_headers.started", "http2.send_request_headers.started")
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """An httpx transport that exports in-flight requests, pool wait time and connection reuse."""
+
+    def __init__(self, client_name: str, **kwargs):
+        super().__init__(**kwargs)
+        self.client_name = client_name
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start_time = time.perf_counter()
+        state = {"acquired": False, "new_connection": False}
+        parent_trace = request.extensions.get("trace")
+
+        async def trace(event_name, info):
+            if not state["acquired"] and (event_name in _NEW_CONNECTION_EVENTS or event_name in _SEND_EVENTS):
+                state["acquired"] = True
+                state["new_connection"] = event_name in _NEW_CONNECTION_EVENTS
+                HTTP_CLIENT_POOL_WAIT.labels(client=self.client_name).observe(time.perf_counter() - start_time)
+            if parent_trace is not None:
+                await parent_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        in_flight = HTTP_CLIENT_IN_FLIGHT.labels(client=self.client_name)
+        in_flight.inc()
+        try:
+            return await super().handle_async_request(request)
+        finally:
+            in_flight.dec()
+            if state["acquired"]:
+                reused = "false" if state["new_connection"] else "true"
+                HTTP_CLIENT_CONNECTIONS.labels(client=self.client_name, reused=reused).inc()
+
+
+def create_http_client(
+    name: str,
+    base_url: str = "",
+    timeout: Optional[float] = None,
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+    keepalive_expiry: Optional[float] = None,
+    http2: Optional[bool] = None,
+) -> httpx.AsyncClient:
+    """
+    Builds a pooled, instrumented AsyncClient.
+
+    Settings not passed explicitly fall back to the HTTP_CLIENT_* environment
+    variables. Create one client per downstream and reuse it for the life of the
+    process so connections are kept alive between calls.
+    """
+    if timeout is None:
+        timeout = float(os.environ.get("HTTP_CLIENT_TIMEOUT_SECONDS", "5"))
+    if max_connections is None:
+        max_connections = int(os.environ.get("HTTP_CLIENT_MAX_CONNECTIONS", "100"))
+    if max_keepalive_connections is None:
+        max_keepalive_connections = int(os.environ.get("HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    if keepalive_expiry is None:
+        keepalive_expiry = float(os.environ.get("HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS", "30"))
+    if http2 is None:
+        http2 = os.environ.get("HTTP_CLIENT_HTTP2", "false").lower() == "true"
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    transport = InstrumentedTransport(name, limits=limits, http2=http2)
+    return httpx.AsyncClient(base_url=base_url, timeout=timeout, transport=transport)
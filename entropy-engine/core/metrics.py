@@ -0,0 +1,27 @@
+import os
+
+from prometheus_client import CollectorRegistry, make_asgi_app, multiprocess
+
+# Set by serve.py when running several workers; each one writes its samples here
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def make_metrics_app():
+    """
+    Returns the ASGI app serving /metrics.
+
+    With several workers it aggregates every worker's samples from
+    MULTIPROC_DIR, so a scrape sees the container's totals rather than
+    whichever worker happened to answer.
+    """
+    if not MULTIPROC_DIR:
+        return make_asgi_app()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return make_asgi_app(registry)
+
+
+def mark_worker_stopped() -> None:
+    """Drops this worker's live gauges from the aggregate when it shuts down."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,148 @@
+import asyncio
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import structlog
+from prometheus_client import Counter
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+from .config import ServiceConfig
+
+logger = structlog.get_logger()
+
+CURVES = ("linear", "exponential", "sine", "keyframes")
+ENTROPY_TYPES = ("latency", "errors")
+
+DEFAULT_TICK_RATE = float(os.environ.get("RAMP_TICK_RATE_HZ", "2"))
+PUSH_MIN_INTERVAL = float(os.environ.get("ENTROPY_PUSH_MIN_INTERVAL_SECONDS", "0.2"))
+
+ENTROPY_UPDATES = Counter(
+    "entropy_updates_total",
+    "Entropy updates for services by outcome",
+    ["service", "result"]
+)
+
+
+class RampSpec(BaseModel):
+    """How a "ramp" step moves one entropy value over the step's duration."""
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    entropy: str  # "latency" or "errors"
+    curve: str = "linear"
+    start: float = Field(0.0, alias="from")
+    end: float = Field(0.0, alias="to")
+    keyframes: List[Tuple[float, float]] = []  # (seconds into the step, value)
+    steepness: float = 5.0  # exponential curve
+    cycles: float = 1.0  # sine curve
+    tick_rate: Optional[float] = None  # updates per second
+
+    @model_validator(mode="after")
+    def check_spec(self):
+        if self.entropy not in ENTROPY_TYPES:
+            raise ValueError(f"Unknown ramp entropy type: {self.entropy}")
+        if self.curve == "exponential" and self.steepness == 0:
+            raise ValueError("Exponential ramps need a non-zero steepness; use a linear curve instead")
+        return self
+
+
+def interpolate(ramp: RampSpec, elapsed: float, duration: float) -> float:
+    """Returns the ramp's value `elapsed` seconds into a step lasting `duration` seconds."""
+    if ramp.curve == "keyframes":
+        frames = sorted(ramp.keyframes)
+        if not frames:
+            return ramp.start
+        if elapsed <= frames[0][0]:
+            return frames[0][1]
+        for (t0, v0), (t1, v1) in zip(frames, frames[1:]):
+            if elapsed <= t1:
+                return v0 + (v1 - v0) * (elapsed - t0) / (t1 - t0) if t1 > t0 else v1
+        return frames[-1][1]
+
+    progress = min(max(elapsed / duration, 0.0), 1.0) if duration > 0 else 1.0
+    if ramp.curve == "linear":
+        shape = progress
+    elif ramp.curve == "exponential":
+        shape = math.expm1(ramp.steepness * progress) / math.expm1(ramp.steepness)
+    elif ramp.curve == "sine":
+        # Oscillates from `start` to `end` and back, `cycles` times
+        shape = (1 - math.cos(2 * math.pi * ramp.cycles * progress)) / 2
+    else:
+        raise ValueError(f"Unknown ramp curve: {ramp.curve}")
+    return ramp.start + (ramp.end - ramp.start) * shape
+
+
+class EntropyPusher:
+    """
+    Delivers entropy values to services, coalescing bursts per target.
+
+    Each (service, entropy type) pair has at most one request in flight and at
+    least `min_interval` seconds between requests. Values submitted meanwhile
+    overwrite each other so only the latest is sent, and values equal to what
+    the service already has are dropped. What the service "already has" is
+    only known while nothing else changes it, so create one pusher per
+    scenario run and call `forget` after changing a service any other way.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, min_interval: float = PUSH_MIN_INTERVAL, precision: int = 4):
+        self.client = client
+        self.min_interval = min_interval
+        self.precision = precision
+        self._pending: Dict[Tuple[str, str], float] = {}
+        self._last_sent: Dict[Tuple[str, str], float] = {}
+        self._workers: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def submit(self, service: ServiceConfig, entropy_type: str, value: float) -> None:
+        key = (service.id, entropy_type)
+        value = round(value, self.precision)
+        if key not in self._workers and self._last_sent.get(key) == value:
+            ENTROPY_UPDATES.labels(service=service.id, result="dropped").inc()
+            return
+        if key in self._pending:
+            ENTROPY_UPDATES.labels(service=service.id, result="coalesced").inc()
+        self._pending[key] = value
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._drain(service, entropy_type))
+
+    def forget(self, service_id: str) -> None:
+        """Drops what was last sent to a service, so the next value is sent even if it repeats."""
+        for key in [key for key in self._last_sent if key[0] == service_id]:
+            del self._last_sent[key]
+
+    async def flush(self, service_id: Optional[str] = None) -> None:
+        """Waits until pending updates (optionally for one service) have been delivered."""
+        workers = [task for (sid, _), task in self._workers.items() if service_id in (None, sid)]
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _drain(self, service: ServiceConfig, entropy_type: str) -> None:
+        key = (service.id, entropy_type)
+        try:
+            while key in self._pending:
+                value = self._pending.pop(key)
+                if self._last_sent.get(key) == value:
+                    ENTROPY_UPDATES.labels(service=service.id, result="dropped").inc()
+                    continue
+                if await self._send(service, entropy_type, value):
+                    self._last_sent[key] = value
+                if key in self._pending:
+                    await asyncio.sleep(self.min_interval)
+        finally:
+            del self._workers[key]
+
+    async def _send(self, service: ServiceConfig, entropy_type: str, value: float) -> bool:
+        endpoint = service.entropy_endpoints.get(entropy_type)
+        if not endpoint:
+            logger.error("Invalid entropy type for ramp", service_id=service.id, entropy_type=entropy_type)
+            return False
+        payload_key = "latency" if entropy_type == "latency" else "error_rate"
+        try:
+            response = await self.client.post(f"{service.url}{endpoint}", json={payload_key: value})
+            response.raise_for_status()
+        except (httpx.RequestError, httpx.HTTPStatusError) as e:
+            ENTROPY_UPDATES.labels(service=service.id, result="failed").inc()
+            logger.error("Failed to push entropy update", service_id=service.id, entropy_type=entropy_type, error=str(e))
+            return False
+        ENTROPY_UPDATES.labels(service=service.id, result="sent").inc()
+        return True
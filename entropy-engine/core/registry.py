@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import structlog
+import yaml
+from prometheus_client import Counter, Gauge, Histogram
+from pydantic import ValidationError
+
+from .config import ServiceConfig
+from .scenarios import Scenario
+
+logger = structlog.get_logger()
+
+REGISTRY_RELOADS = Counter(
+    "config_registry_file_reloads_total",
+    "Configuration files examined by a registry refresh, by outcome",
+    ["registry", "result"]
+)
+REGISTRY_RELOAD_DURATION = Histogram(
+    "config_registry_refresh_duration_seconds",
+    "Time taken to scan and reload a registry's configuration files",
+    ["registry"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+REGISTRY_ENTRIES = Gauge(
+    "config_registry_entries",
+    "Entries currently loaded in a registry",
+    ["registry"],
+    multiprocess_mode="livemax"
+)
+
+
+class _CachedFile(NamedTuple):
+    mtime_ns: int
+    size: int
+    digest: str
+    items: List[Any]
+
+
+class YamlRegistry(ABC):
+    """
+    Abstract base class for validated objects loaded from YAML files.
+
+    Nothing is read until the first lookup. After that, `refresh` only re-reads
+    files whose mtime or size changed, and only re-parses them when their
+    content hash changed too. A file that fails to parse or validate keeps its
+    previously loaded objects. Lookups go through an index by key.
+    """
+
+    name = "yaml"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._files: Dict[str, _CachedFile] = {}
+        self._index: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    def _paths(self) -> List[str]:
+        """Returns the files the registry is loaded from."""
+        pass
+
+    @abstractmethod
+    def _parse(self, data: Any) -> List[Any]:
+        """Validates one file's YAML data into the objects it defines."""
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def _key(item: Any) -> str:
+        pass
+
+    def refresh(self) -> Dict[str, int]:
+        """Reloads changed files and rebuilds the index; returns counts by outcome."""
+        start = time.perf_counter()
+        counts = {"loaded": 0, "unchanged": 0, "error": 0, "removed": 0}
+        with self._lock:
+            files = {}
+            for file_path in self._paths():
+                cached = self._files.get(file_path)
+                stat = digest = None
+                try:
+                    stat = os.stat(file_path)
+                    if cached is not None and (stat.st_mtime_ns, stat.st_size) == (cached.mtime_ns, cached.size):
+                        files[file_path] = cached
+                        counts["unchanged"] += 1
+                        continue
+                    with open(file_path, "rb") as f:
+                        content = f.read()
+                    digest = hashlib.sha256(content).hexdigest()
+                    if cached is not None and digest == cached.digest:
+                        # Touched but not modified
+                        files[file_path] = cached._replace(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                        counts["unchanged"] += 1
+                        continue
+                    items = self._parse(yaml.safe_load(content))
+                except (OSError, yaml.YAMLError, ValidationError, AttributeError, TypeError, ValueError) as e:
+                    logger.error("Failed to load configuration file", registry=self.name, path=file_path, error=str(e))
+                    counts["error"] += 1
+                    items = cached.items if cached is not None else []
+                    if digest is not None:
+                        # Remember the broken version so it isn't re-parsed until it changes
+                        files[file_path] = _CachedFile(stat.st_mtime_ns, stat.st_size, digest, items)
+                    elif cached is not None:
+                        files[file_path] = cached
+                    continue
+                files[file_path] = _CachedFile(stat.st_mtime_ns, stat.st_size, digest, items)
+                counts["loaded"] += 1
+                if cached is not None:
+                    logger.info("Reloaded configuration file", registry=self.name, path=file_path)
+
+            counts["removed"] = len(self._files.keys() - files.keys())
+            index = {}
+            for file_path in sorted(files):
+                for item in files[file_path].items:
+                    key = self._key(item)
+                    if key in index:
+                        logger.warning("Duplicate configuration entry", registry=self.name, key=key, path=file_path)
+                    index[key] = item
+            self._files = files
+            self._index = index
+
+        for result, count in counts.items():
+            if count:
+                REGISTRY_RELOADS.labels(registry=self.name, result=result).inc(count)
+        REGISTRY_ENTRIES.labels(registry=self.name).set(len(index))
+        REGISTRY_RELOAD_DURATION.labels(registry=self.name).observe(time.perf_counter() - start)
+        return counts
+
+    def _entries(self) -> Dict[str, Any]:
+        index = self._index
+        if index is None:
+            self.refresh()
+            index = self._index
+        return index
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._entries().get(key)
+
+    def all(self) -> List[Any]:
+        return list(self._entries().values())
+
+    def start_watching(self, interval: float) -> None:
+        """Polls the files every `interval` seconds and reloads the ones that changed."""
+        if self._watcher is None and interval > 0:
+            self._watcher = asyncio.create_task(self._watch(interval))
+
+    async def stop_watching(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    async def _watch(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error("Configuration refresh failed", registry=self.name, error=str(e))
+
+
+class ScenarioRegistry(YamlRegistry):
+    """Scenarios from every .yml file in a directory, indexed by name."""
+
+    name = "scenarios"
+
+    def _paths(self) -> List[str]:
+        return [
+            os.path.join(self.path, filename)
+            for filename in sorted(os.listdir(self.path))
+            if filename.endswith(".yml")
+        ]
+
+    def _parse(self, data: Any) -> List[Scenario]:
+        return [Scenario(**data)]
+
+    @staticmethod
+    def _key(item: Scenario) -> str:
+        return item.name
+
+
+class ServiceRegistry(YamlRegistry):
+    """Services from a single services.yml file, indexed by id."""
+
+    name = "services"
+
+    def _paths(self) -> List[str]:
+        return [self.path]
+
+    def _parse(self, data: Any) -> List[ServiceConfig]:
+        return [ServiceConfig(**service) for service in data.get("services", [])]
+
+    @staticmethod
+    def _key(item: ServiceConfig) -> str:
+        return item.id
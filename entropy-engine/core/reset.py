@@ -0,0 +1,96 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+import httpx
+import structlog
+
+from .config import ServiceConfig
+
+logger = structlog.get_logger()
+
+
+async def _reset_target(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    service: ServiceConfig,
+    entropy_type: str,
+    endpoint: str,
+    deadline: float,
+    max_attempts: int,
+    retry_delay: float,
+) -> Dict[str, Any]:
+    """Resets one entropy endpoint, retrying within its attempt budget and the global deadline."""
+    target_url = f"{service.url}{endpoint}"
+    payload_key = "latency" if entropy_type == "latency" else "error_rate"
+    loop = asyncio.get_running_loop()
+    result: Dict[str, Any] = {"status": "failed", "attempts": 0}
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            async with semaphore:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    result["status"] = "timeout"
+                    break
+                result["attempts"] = attempt
+                response = await client.post(target_url, json={payload_key: 0}, timeout=remaining)
+            response.raise_for_status()
+            logger.info("Successfully reset entropy", service=service.id, type=entropy_type, attempt=attempt)
+            return {"status": "ok", "attempts": attempt}
+        except (httpx.RequestError, httpx.HTTPStatusError) as e:
+            result["error"] = str(e) or type(e).__name__
+            if attempt < max_attempts:
+                # Services may answer 500 because of the very entropy being reset
+                logger.warning("Retry entropy reset", service=service.id, type=entropy_type, attempt=attempt, error=result["error"])
+                await asyncio.sleep(min(retry_delay * 2 ** (attempt - 1), max(deadline - loop.time(), 0)))
+
+    logger.error("Failed to reset entropy", service=service.id, type=entropy_type, **result)
+    return result
+
+
+async def reset_services(
+    client: httpx.AsyncClient,
+    config: List[ServiceConfig],
+    concurrency: int = 16,
+    deadline_seconds: float = 5.0,
+    max_attempts: int = 3,
+    retry_delay: float = 0.1,
+) -> Dict[str, Any]:
+    """
+    Resets every entropy endpoint of every service concurrently.
+
+    At most `concurrency` requests are in flight at once and the whole fan-out
+    is bounded by `deadline_seconds`. Each target gets `max_attempts` tries.
+    Returns a per-service, per-entropy-type report.
+    """
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + deadline_seconds
+    semaphore = asyncio.Semaphore(concurrency)
+
+    tasks = {}
+    for service in config:
+        for entropy_type, endpoint in service.entropy_endpoints.items():
+            task = asyncio.create_task(
+                _reset_target(client, semaphore, service, entropy_type, endpoint, deadline, max_attempts, retry_delay)
+            )
+            tasks[task] = (service.id, entropy_type)
+
+    results: Dict[str, Dict[str, Any]] = {service.id: {} for service in config}
+    if tasks:
+        done, pending = await asyncio.wait(tasks, timeout=deadline_seconds)
+        for task in pending:
+            task.cancel()
+        for task, (service_id, entropy_type) in tasks.items():
+            if task in done:
+                results[service_id][entropy_type] = task.result()
+            else:
+                results[service_id][entropy_type] = {"status": "timeout", "attempts": None}
+
+    success = all(r["status"] == "ok" for targets in results.values() for r in targets.values())
+    return {
+        "success": success,
+        "duration_seconds": round(time.perf_counter() - start, 3),
+        "services": results,
+    }
@@ -1,71 +1,219 @@
 import asyncio
+import time
 import httpx
-import yaml
-import os
-from typing import List, Dict, Any
-from pydantic import BaseModel
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, model_validator
 import structlog
+from redis.exceptions import RedisError
 
 from .state import StateStore
 from .config import ServiceConfig
+from .distribution import EntropyPublisher, uses_push
+from .docker_utils import docker_controller
+from .ramps import CURVES, DEFAULT_TICK_RATE, EntropyPusher, RampSpec, interpolate
 
 logger = structlog.get_logger()
 
 running_scenarios = []
 
+# Scheduled-vs-actual start times of each scenario's most recent run
+scenario_timings: Dict[str, Dict[str, Any]] = {}
+
 class ScenarioStep(BaseModel):
     type: str
-    service_id: str
-    state: Dict[str, Any]
-    duration: int = 0
+    service_id: Optional[str] = None
+    state: Dict[str, Any] = {}
+    duration: float = 0
+    # Scheduling. A step without `start_at` or `depends_on` starts when the
+    # previous step's duration has elapsed, as in a plain sequential scenario.
+    id: Optional[str] = None
+    start_at: Optional[float] = None  # seconds from scenario start
+    depends_on: List[str] = []  # ids of steps whose duration must elapse first
+    # Children of a "parallel" step all start together at the step's offset,
+    # each shifted by its own optional `start_at`
+    steps: List["ScenarioStep"] = []
+    # Docker steps: the action to perform, its parameters, and optionally
+    # several containers to act on at once instead of service_id
+    action: Optional[str] = None
+    params: Dict[str, Any] = {}
+    service_ids: List[str] = []
+    # How a "ramp" step moves one entropy value over its duration
+    ramp: Optional[RampSpec] = None
+
+    @model_validator(mode="after")
+    def check_ramp(self):
+        if self.type != "ramp":
+            return self
+        if self.ramp is None or not self.service_id:
+            raise ValueError("Ramp steps need a service_id and a ramp")
+        if self.ramp.curve not in CURVES:
+            raise ValueError(f"Unknown ramp curve: {self.ramp.curve}")
+        if self.ramp.curve == "keyframes" and not self.ramp.keyframes:
+            raise ValueError("Keyframe ramps need at least one keyframe")
+        if self.ramp.tick_rate is not None and self.ramp.tick_rate <= 0:
+            raise ValueError("Ramp tick_rate must be positive")
+        return self
+
+class ScheduledStep(BaseModel):
+    label: str
+    offset: float
+    step: ScenarioStep
 
 class Scenario(BaseModel):
     name: str
     description: str
     steps: List[ScenarioStep]
 
-def load_scenarios(path: str = "scenarios") -> List[Scenario]:
-    """Loads all scenarios from a directory."""
-    scenarios = []
-    for filename in os.listdir(path):
-        if filename.endswith(".yml"):
-            with open(os.path.join(path, filename), "r") as f:
-                scenario_data = yaml.safe_load(f)
-                scenarios.append(Scenario(**scenario_data))
-    return scenarios
-
-async def run_scenario_step(step: ScenarioStep, store: StateStore, config: List[ServiceConfig]):
+    @model_validator(mode="after")
+    def check_schedule(self):
+        build_schedule(self.steps)
+        return self
+
+def _window(step: ScenarioStep) -> float:
+    """How long a step occupies the timeline before steps that follow it may start."""
+    if step.type != "parallel":
+        return step.duration
+    children = max(((child.start_at or 0) + _window(child) for child in step.steps), default=0)
+    return max(step.duration, children)
+
+def _expand(step: ScenarioStep, label: str, offset: float, schedule: List[ScheduledStep]) -> None:
+    if step.type != "parallel":
+        schedule.append(ScheduledStep(label=label, offset=offset, step=step))
+        return
+    for index, child in enumerate(step.steps):
+        if child.depends_on:
+            raise ValueError(f"Step '{label}': steps inside a parallel group cannot use depends_on")
+        _expand(child, child.id or f"{label}.{index + 1}", offset + (child.start_at or 0), schedule)
+
+def _resolve_offsets(steps: List[ScenarioStep]) -> List[float]:
+    """
+    Resolves each top-level step's start offset in seconds.
+
+    Steps form a DAG: each one starts at its `start_at`, when all of its
+    `depends_on` steps have run for their duration, or otherwise right after
+    the previous step. Raises ValueError for unknown dependencies and cycles.
+    """
+    labels = [_label(step, index) for index, step in enumerate(steps)]
+    by_id = {step.id: index for index, step in enumerate(steps) if step.id}
+    offsets: Dict[int, float] = {}
+
+    def resolve(index: int, visiting: tuple) -> float:
+        if index in offsets:
+            return offsets[index]
+        if index in visiting:
+            cycle = " -> ".join(labels[i] for i in visiting + (index,))
+            raise ValueError(f"Scenario steps have a dependency cycle: {cycle}")
+        step = steps[index]
+        if step.start_at is not None and step.depends_on:
+            raise ValueError(f"Step '{labels[index]}' cannot set both start_at and depends_on")
+
+        if step.start_at is not None:
+            offset = step.start_at
+        elif step.depends_on:
+            offset = 0.0
+            for dependency in step.depends_on:
+                if dependency not in by_id:
+                    raise ValueError(f"Step '{labels[index]}' depends on unknown step '{dependency}'")
+                parent = by_id[dependency]
+                offset = max(offset, resolve(parent, visiting + (index,)) + _window(steps[parent]))
+        elif index == 0:
+            offset = 0.0
+        else:
+            offset = resolve(index - 1, visiting + (index,)) + _window(steps[index - 1])
+        offsets[index] = offset
+        return offset
+
+    return [resolve(index, ()) for index in range(len(steps))]
+
+def _label(step: ScenarioStep, index: int) -> str:
+    return step.id or f"step-{index + 1}"
+
+def build_schedule(steps: List[ScenarioStep]) -> List[ScheduledStep]:
+    """Resolves a scenario into leaf steps with absolute start offsets, flattening parallel groups."""
+    schedule: List[ScheduledStep] = []
+    for index, (step, offset) in enumerate(zip(steps, _resolve_offsets(steps))):
+        _expand(step, _label(step, index), offset, schedule)
+    return sorted(schedule, key=lambda entry: entry.offset)
+
+def scenario_length(steps: List[ScenarioStep]) -> float:
+    """The offset at which the last step's duration has elapsed."""
+    return max((offset + _window(step) for step, offset in zip(steps, _resolve_offsets(steps))), default=0)
+
+async def run_ramp(step: ScenarioStep, service: ServiceConfig, store: StateStore, pusher: EntropyPusher, publisher: Optional[EntropyPublisher] = None):
+    """
+    Moves one entropy value along the step's curve for the step's duration.
+
+    Values are computed at fixed ticks from a monotonic start time and either
+    published to every replica or handed to the pusher, which coalesces them
+    so the service only sees changes.
+    """
+    ramp = step.ramp
+    interval = 1 / (ramp.tick_rate or DEFAULT_TICK_RATE)
+    ticks = [i * interval for i in range(int(step.duration / interval) + 1)]
+    if ticks[-1] < step.duration:
+        ticks.append(step.duration)
+    # Keep the stored state keyed the way set_entropy normalizes it
+    state_key = "error_rate" if ramp.entropy == "errors" else ramp.entropy
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for elapsed in ticks:
+        delay = start + elapsed - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        value = interpolate(ramp, elapsed, step.duration)
+        state = await store.update_state(service.id, {state_key: value})
+        if uses_push(publisher, service):
+            try:
+                await publisher.publish(service.id, state)
+            except RedisError as e:
+                logger.error("Failed to publish entropy configuration", service_id=service.id, error=str(e))
+        else:
+            pusher.submit(service, ramp.entropy, value)
+    await pusher.flush(service.id)
+
+async def run_scenario_step(step: ScenarioStep, store: StateStore, config: List[ServiceConfig], client: httpx.AsyncClient, pusher: Optional[EntropyPusher] = None, publisher: Optional[EntropyPublisher] = None):
     """Executes a single step of a scenario by calling the service directly."""
     logger.info("Executing scenario step", step=step)
 
     if step.type == "docker":
-        container = get_container(step.service_id)
-        if not container:
-            logger.error("Container not found", service_id=step.service_id)
-            return
-
-        if step.action == "set_env":
-            for key, value in step.params.items():
-                set_environment_variable(container, key, value)
-        elif step.action == "set_resources":
-            update_resource_limits(container, **step.params)
-        elif step.action == "disconnect_network":
-            disconnect_network(container)
-        elif step.action == "connect_network":
-            connect_network(container)
-        elif step.action == "stop":
-            stop_container(container)
-        elif step.action == "start":
-            start_container(container)
-        else:
+        service_ids = step.service_ids or [step.service_id]
+        try:
+            results = await docker_controller.perform_many(service_ids, step.action, step.params)
+        except ValueError:
             logger.error("Invalid docker action", action=step.action)
+            return
+        for service_id, result in results.items():
+            if pusher is not None:
+                # A restarted container comes back without the entropy it had
+                pusher.forget(service_id)
+            if result["status"] == "not_found":
+                logger.error("Container not found", service_id=service_id)
+    elif step.type == "ramp":
+        service = next((s for s in config if s.id == step.service_id), None)
+        if not service:
+            logger.error("Service not found in config", service_id=step.service_id)
+            return
+        await run_ramp(step, service, store, pusher or EntropyPusher(client), publisher)
     else:
         service = next((s for s in config if s.id == step.service_id), None)
         if not service:
             logger.error("Service not found in config", service_id=step.service_id)
             return
 
-        store.set_state(step.service_id, step.state)
+        # Merge into the stored state with its keys normalized as set_entropy
+        # does, so a publish carries the service's full entropy state
+        changes = {"error_rate" if key == "errors" else key: value for key, value in step.state.items()}
+        state = await store.update_state(step.service_id, changes, defaults={"latency": 0, "error_rate": 0})
+        if pusher is not None:
+            # The service no longer holds what a ramp last sent it
+            pusher.forget(step.service_id)
+        if uses_push(publisher, service):
+            try:
+                await publisher.publish(step.service_id, state)
+            except RedisError as e:
+                logger.error("Failed to publish entropy configuration", service_id=step.service_id, error=str(e))
+            return
 
         entropy_type, value = next(iter(step.state.items()))
         endpoint = service.entropy_endpoints.get(entropy_type)
@@ -75,21 +223,54 @@ async def run_scenario_step(step: ScenarioStep, store: StateStore, config: List[
 
         target_url = f"{service.url}{endpoint}"
         try:
-            async with httpx.AsyncClient() as client:
-                payload_key = "latency" if entropy_type == "latency" else "error_rate"
-                response = await client.post(target_url, json={payload_key: value})
-                response.raise_for_status()
+            payload_key = "latency" if entropy_type == "latency" else "error_rate"
+            response = await client.post(target_url, json={payload_key: value})
+            response.raise_for_status()
         except httpx.RequestError as e:
             logger.error("Failed to execute scenario step", step=step, error=str(e))
 
-async def run_scenario_in_background(scenario: Scenario, store: StateStore, config: List[ServiceConfig]):
-    """Runs a full scenario in a background task."""
+async def run_scenario_in_background(scenario: Scenario, store: StateStore, config: List[ServiceConfig], client: httpx.AsyncClient, pusher: Optional[EntropyPusher] = None, publisher: Optional[EntropyPublisher] = None):
+    """
+    Runs a full scenario in a background task.
+
+    Every step is started at its absolute offset from a single monotonic start
+    time, so slow steps never push later ones back and steps with the same
+    offset start together.
+    """
     logger.info("Starting scenario", scenario_name=scenario.name)
     running_scenarios.append(scenario.name)
-    for step in scenario.steps:
-        await run_scenario_step(step, store, config)
-        if step.duration > 0:
-            logger.info("Waiting for step duration", duration=step.duration)
-            await asyncio.sleep(step.duration)
-    logger.info("Scenario finished", scenario_name=scenario.name)
-    running_scenarios.remove(scenario.name)
+    schedule = build_schedule(scenario.steps)
+    pusher = pusher or EntropyPusher(client)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    timings = []
+
+    async def run_at(entry: ScheduledStep):
+        delay = start + entry.offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        actual_offset = loop.time() - start
+        timings.append({
+            "step": entry.label,
+            "service_id": entry.step.service_id,
+            "scheduled_offset": round(entry.offset, 4),
+            "actual_offset": round(actual_offset, 4),
+            "drift_ms": round((actual_offset - entry.offset) * 1000, 2),
+        })
+        await run_scenario_step(entry.step, store, config, client, pusher, publisher)
+
+    try:
+        await asyncio.gather(*(run_at(entry) for entry in schedule))
+        remaining = start + scenario_length(scenario.steps) - loop.time()
+        if remaining > 0:
+            logger.info("Waiting for scenario to finish", remaining=round(remaining, 3))
+            await asyncio.sleep(remaining)
+    finally:
+        timings.sort(key=lambda timing: timing["scheduled_offset"])
+        scenario_timings[scenario.name] = {
+            "started_at": time.time() - (loop.time() - start),
+            "max_drift_ms": max((abs(timing["drift_ms"]) for timing in timings), default=0),
+            "steps": timings,
+        }
+        logger.info("Scenario finished", scenario_name=scenario.name, max_drift_ms=scenario_timings[scenario.name]["max_drift_ms"])
+        running_scenarios.remove(scenario.name)
@@ -1,11 +1,32 @@
+import asyncio
+import json
+import os
+import random
+import uuid
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+import redis.asyncio as aioredis
+import structlog
+from prometheus_client import Counter
+
+logger = structlog.get_logger()
+
+STATE_CACHE_REQUESTS = Counter(
+    "entropy_state_cache_requests_total",
+    "Local state cache lookups by result",
+    ["result"]
+)
+STATE_WRITE_CONFLICTS = Counter(
+    "entropy_state_write_conflicts_total",
+    "Optimistic state updates retried because another replica wrote first"
+)
 
 class StateStore(ABC):
     """Abstract base class for a key-value state store."""
 
     @abstractmethod
-    def get_state(self, service_id: str) -> Dict[str, Any]:
+    async def get_state(self, service_id: str) -> Dict[str, Any]:
         """
         Retrieves the state for a given service.
 
@@ -18,7 +39,7 @@ class StateStore(ABC):
         pass
 
     @abstractmethod
-    def set_state(self, service_id: str, state: Dict[str, Any]) -> None:
+    async def set_state(self, service_id: str, state: Dict[str, Any]) -> None:
         """
         Sets the state for a given service.
 
@@ -28,16 +49,229 @@ class StateStore(ABC):
         """
         pass
 
+    @abstractmethod
+    async def update_state(self, service_id: str, changes: Dict[str, Any], defaults: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Atomically merges changes into a service's state.
+
+        Args:
+            service_id: The identifier of the service.
+            changes: The keys to set.
+            defaults: The state to start from if the service has none yet.
+
+        Returns:
+            The service's state after the update.
+        """
+        pass
+
+    async def get_states(self, service_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Retrieves the state of several services at once."""
+        return {service_id: await self.get_state(service_id) for service_id in service_ids}
+
+    async def set_states(self, states: Dict[str, Dict[str, Any]]) -> None:
+        """Sets the state of several services at once."""
+        for service_id, state in states.items():
+            await self.set_state(service_id, state)
+
+    async def start(self) -> None:
+        """Starts any background work the store needs."""
+        pass
+
+    async def close(self) -> None:
+        """Releases any resources held by the store."""
+        pass
+
 class InMemoryStateStore(StateStore):
     """An in-memory implementation of the StateStore."""
 
     def __init__(self):
         self._state: Dict[str, Dict[str, Any]] = {}
 
-    def get_state(self, service_id: str) -> Dict[str, Any]:
+    async def get_state(self, service_id: str) -> Dict[str, Any]:
         """Retrieves the state for a given service."""
         return self._state.get(service_id, {})
 
-    def set_state(self, service_id: str, state: Dict[str, Any]) -> None:
+    async def set_state(self, service_id: str, state: Dict[str, Any]) -> None:
         """Sets the state for a given service."""
         self._state[service_id] = state
+
+    async def update_state(self, service_id: str, changes: Dict[str, Any], defaults: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Merges changes into the state for a given service."""
+        state = {**(self._state.get(service_id) or defaults or {}), **changes}
+        self._state[service_id] = state
+        return state
+
+class RedisStateStore(StateStore):
+    """
+    A Redis implementation of the StateStore, shared by every engine replica.
+
+    Each service's state is a hash of JSON-encoded values. Multi-service reads
+    and writes are pipelined, and `update_state` uses WATCH/MULTI so concurrent
+    read-modify-writes from different replicas don't lose updates.
+
+    Reads are served from a local cache. Every write publishes the changed
+    service id on CHANGES_CHANNEL, and each replica drops its cached copy when
+    another replica's change arrives. The whole cache is dropped whenever the
+    subscription (re)connects, since changes may have been missed meanwhile.
+    """
+
+    KEY_PREFIX = "entropy:state:"
+    CHANGES_CHANNEL = "entropy:state:changes"
+
+    def __init__(self, client: aioredis.Redis, max_update_attempts: int = 10):
+        self.client = client
+        self.max_update_attempts = max_update_attempts
+        self._node_id = uuid.uuid4().hex
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        # Bumped on every invalidation so reads racing with one don't cache stale data
+        self._generation = 0
+        self._listening = False
+        self._listener: Optional[asyncio.Task] = None
+
+    def _key(self, service_id: str) -> str:
+        return f"{self.KEY_PREFIX}{service_id}"
+
+    @staticmethod
+    def _decode(raw: Dict) -> Dict[str, Any]:
+        return {
+            (field.decode() if isinstance(field, bytes) else field): json.loads(value)
+            for field, value in raw.items()
+        }
+
+    @staticmethod
+    def _encode(state: Dict[str, Any]) -> Dict[str, str]:
+        return {field: json.dumps(value) for field, value in state.items()}
+
+    def _cache_put(self, service_id: str, state: Dict[str, Any], generation: int) -> None:
+        # Without a live subscription the cache can't be trusted to stay coherent,
+        # and an invalidation since `generation` was read means `state` may be stale
+        if self._listening and generation == self._generation:
+            self._cache[service_id] = state
+
+    async def _publish(self, service_ids: List[str]) -> None:
+        message = json.dumps({"service_ids": service_ids, "origin": self._node_id})
+        await self.client.publish(self.CHANGES_CHANNEL, message)
+
+    async def get_state(self, service_id: str) -> Dict[str, Any]:
+        return (await self.get_states([service_id]))[service_id]
+
+    async def get_states(self, service_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        states = {}
+        missing = []
+        for service_id in service_ids:
+            if service_id in self._cache:
+                STATE_CACHE_REQUESTS.labels(result="hit").inc()
+                states[service_id] = dict(self._cache[service_id])
+            else:
+                STATE_CACHE_REQUESTS.labels(result="miss").inc()
+                missing.append(service_id)
+
+        if missing:
+            generation = self._generation
+            async with self.client.pipeline(transaction=False) as pipe:
+                for service_id in missing:
+                    pipe.hgetall(self._key(service_id))
+                results = await pipe.execute()
+            for service_id, raw in zip(missing, results):
+                state = self._decode(raw)
+                self._cache_put(service_id, state, generation)
+                states[service_id] = dict(state)
+        return states
+
+    async def set_state(self, service_id: str, state: Dict[str, Any]) -> None:
+        await self.set_states({service_id: state})
+
+    async def set_states(self, states: Dict[str, Dict[str, Any]]) -> None:
+        if not states:
+            return
+        generation = self._generation
+        async with self.client.pipeline(transaction=True) as pipe:
+            for service_id, state in states.items():
+                pipe.delete(self._key(service_id))
+                if state:
+                    pipe.hset(self._key(service_id), mapping=self._encode(state))
+            await pipe.execute()
+        for service_id, state in states.items():
+            self._cache_put(service_id, dict(state), generation)
+        await self._publish(list(states))
+
+    async def update_state(self, service_id: str, changes: Dict[str, Any], defaults: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        key = self._key(service_id)
+        generation = self._generation
+        async with self.client.pipeline(transaction=True) as pipe:
+            for attempt in range(self.max_update_attempts):
+                try:
+                    await pipe.watch(key)
+                    state = self._decode(await pipe.hgetall(key)) or dict(defaults or {})
+                    state.update(changes)
+                    pipe.multi()
+                    pipe.delete(key)
+                    if state:
+                        pipe.hset(key, mapping=self._encode(state))
+                    await pipe.execute()
+                    break
+                except aioredis.WatchError:
+                    STATE_WRITE_CONFLICTS.inc()
+                    # Jittered backoff so contending replicas don't retry in lockstep
+                    await asyncio.sleep(random.uniform(0, 0.002 * 2 ** attempt))
+            else:
+                raise RuntimeError(f"Gave up updating state for {service_id} after {self.max_update_attempts} conflicts")
+        self._cache_put(service_id, dict(state), generation)
+        await self._publish([service_id])
+        return state
+
+    async def start(self) -> None:
+        """Subscribes to changes published by other replicas."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self.client.aclose()
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.CHANGES_CHANNEL)
+                self._generation += 1
+                self._cache.clear()
+                self._listening = True
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        self._handle_change(message)
+            except aioredis.RedisError as e:
+                logger.warning("State change listener failed", error=str(e))
+                await asyncio.sleep(1.0)
+            finally:
+                self._listening = False
+                self._generation += 1
+                self._cache.clear()
+                await pubsub.aclose()
+
+    def _handle_change(self, message) -> None:
+        payload = json.loads(message["data"])
+        if payload.get("origin") != self._node_id:
+            self._generation += 1
+            for service_id in payload["service_ids"]:
+                self._cache.pop(service_id, None)
+
+def create_state_store() -> StateStore:
+    """Builds the store selected by the STATE_STORE environment variable."""
+    backend = os.environ.get("STATE_STORE", "memory")
+    if backend == "memory":
+        return InMemoryStateStore()
+    if backend == "redis":
+        client = aioredis.Redis.from_url(os.environ.get("STATE_REDIS_URL", "redis://redis:6379/1"))
+        return RedisStateStore(
+            client,
+            max_update_attempts=int(os.environ.get("STATE_MAX_UPDATE_ATTEMPTS", "10")),
+        )
+    raise ValueError(f"Unknown state store backend: {backend}")
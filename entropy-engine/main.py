@@ -2,15 +2,21 @@ import os
 import asyncio
 import structlog
 import httpx
+import redis.asyncio as redis
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Dict, Any, List
 
-from core.state import InMemoryStateStore, StateStore
-from core.config import load_service_config, ServiceConfig
-from core.scenarios import load_scenarios, run_scenario_in_background, Scenario, running_scenarios
-from core.docker_utils import get_container, set_environment_variable, update_resource_limits, disconnect_network, connect_network, stop_container, start_container
+from core.state import StateStore, create_state_store
+from core.config import ServiceConfig
+from core.scenarios import run_scenario_in_background, Scenario, running_scenarios, scenario_timings
+from core.registry import ScenarioRegistry, ServiceRegistry
+from core.reset import reset_services
+from core.distribution import create_entropy_publisher, publish_reset, uses_push
+from core.http_client import create_http_client
+from core.metrics import make_metrics_app, mark_worker_stopped
+from core.docker_utils import ContainerNotFound, docker_controller
 
 # Configure structured logging
 structlog.configure(
@@ -25,21 +31,41 @@ logger = structlog.get_logger()
 
 app = FastAPI()
 
-# Load service and scenario configurations on startup
-service_config = load_service_config()
-scenarios = load_scenarios()
+# Mount the Prometheus metrics app
+metrics_app = make_metrics_app()
+app.mount("/metrics", metrics_app)
 
-# Dependency Injection for StateStore
-state_store = InMemoryStateStore()
+# Service and scenario configurations are loaded on first use and reloaded
+# when their files change
+service_registry = ServiceRegistry(os.environ.get("SERVICES_CONFIG_PATH", "services.yml"))
+scenario_registry = ScenarioRegistry(os.environ.get("SCENARIOS_PATH", "scenarios"))
+CONFIG_RELOAD_INTERVAL_SECONDS = float(os.environ.get("CONFIG_RELOAD_INTERVAL_SECONDS", "2"))
+
+# Dependency Injection for StateStore, selected by STATE_STORE (memory or redis)
+state_store = create_state_store()
+
+# Shared, pooled client for calls to the services' entropy endpoints
+http_client = create_http_client("entropy-engine")
+
+# When ENTROPY_PUSH_URL is set, entropy is pushed to every service replica
+# instead of being POSTed to the one behind the service URL
+entropy_publisher = create_entropy_publisher()
+
+RESET_CONCURRENCY = int(os.environ.get("RESET_CONCURRENCY", "16"))
+RESET_DEADLINE_SECONDS = float(os.environ.get("RESET_DEADLINE_SECONDS", "5"))
+RESET_MAX_ATTEMPTS = int(os.environ.get("RESET_MAX_ATTEMPTS", "3"))
 
 def get_state_store():
     return state_store
 
 def get_service_config():
-    return service_config
+    return service_registry.all()
 
 def get_scenarios():
-    return scenarios
+    return scenario_registry
+
+def get_http_client():
+    return http_client
 
 class ScenarioPayload(BaseModel):
     name: str
@@ -53,12 +79,40 @@ class DockerPayload(BaseModel):
     action: str
     params: Dict[str, Any]
 
+class DockerBatchPayload(BaseModel):
+    service_ids: List[str]
+    action: str
+    params: Dict[str, Any] = {}
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("Entropy Engine starting up...")
-    # Initialize state for all services
-    for service in service_config:
-        state_store.set_state(service.id, {"latency": 0, "error_rate": 0})
+    await state_store.start()
+    service_registry.start_watching(CONFIG_RELOAD_INTERVAL_SECONDS)
+    scenario_registry.start_watching(CONFIG_RELOAD_INTERVAL_SECONDS)
+    # Load both registries off the event loop now rather than inside the first
+    # request that needs them
+    await asyncio.gather(
+        asyncio.to_thread(service_registry.refresh),
+        asyncio.to_thread(scenario_registry.refresh),
+    )
+    # Initialize state for services that don't have any yet; with a shared
+    # store, other replicas may already be running entropy against them
+    states = await state_store.get_states([service.id for service in service_registry.all()])
+    await state_store.set_states({
+        service_id: {"latency": 0, "error_rate": 0} for service_id, state in states.items() if not state
+    })
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await service_registry.stop_watching()
+    await scenario_registry.stop_watching()
+    await http_client.aclose()
+    docker_controller.close()
+    await state_store.close()
+    if entropy_publisher is not None:
+        await entropy_publisher.close()
+    mark_worker_stopped()
 
 @app.get("/api/status")
 async def get_status():
@@ -67,7 +121,12 @@ async def get_status():
     return {"status": "running"}
 
 @app.post("/api/entropy/set")
-async def set_entropy(payload: EntropyPayload, store: StateStore = Depends(get_state_store), config: List[ServiceConfig] = Depends(get_service_config)):
+async def set_entropy(
+    payload: EntropyPayload,
+    store: StateStore = Depends(get_state_store),
+    config: List[ServiceConfig] = Depends(get_service_config),
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
     """Sets the entropy state for a given service."""
     logger.info("Setting entropy state", service_id=payload.service_id, state=payload.state)
     
@@ -85,9 +144,15 @@ async def set_entropy(payload: EntropyPayload, store: StateStore = Depends(get_s
             normalized_state[key] = value
     
     # Update the state with normalized keys
-    current_state = store.get_state(payload.service_id) or {"latency": 0, "error_rate": 0}
-    current_state.update(normalized_state)
-    store.set_state(payload.service_id, current_state)
+    state = await store.update_state(payload.service_id, normalized_state, defaults={"latency": 0, "error_rate": 0})
+
+    if uses_push(entropy_publisher, service):
+        try:
+            version = await entropy_publisher.publish(payload.service_id, state)
+        except redis.RedisError as e:
+            logger.error("Failed to publish entropy configuration", service_id=payload.service_id, error=str(e))
+            raise HTTPException(status_code=500, detail="Failed to publish entropy configuration")
+        return JSONResponse(content={"message": f"Entropy state for {payload.service_id} set", "version": version}, status_code=200)
 
     # Call the target service's entropy endpoint
     entropy_type, value = next(iter(payload.state.items()))
@@ -97,11 +162,10 @@ async def set_entropy(payload: EntropyPayload, store: StateStore = Depends(get_s
 
     target_url = f"{service.url}{endpoint}"
     try:
-        async with httpx.AsyncClient() as client:
-            # The payload key should match the Pydantic model in the target service
-            payload_key = "latency" if entropy_type == "latency" else "error_rate"
-            response = await client.post(target_url, json={payload_key: value})
-            response.raise_for_status()
+        # The payload key should match the Pydantic model in the target service
+        payload_key = "latency" if entropy_type == "latency" else "error_rate"
+        response = await client.post(target_url, json={payload_key: value})
+        response.raise_for_status()
     except httpx.RequestError as e:
         logger.error("Failed to call entropy endpoint", url=target_url, error=str(e))
         raise HTTPException(status_code=500, detail="Failed to call target service")
@@ -112,45 +176,50 @@ async def set_entropy(payload: EntropyPayload, store: StateStore = Depends(get_s
 async def get_entropy_status(service_id: str, store: StateStore = Depends(get_state_store)):
     """Retrieves the current entropy state from the state store for a specific service."""
     logger.info("Getting entropy status", service_id=service_id)
-    state = store.get_state(service_id)
+    state = await store.get_state(service_id)
     if not state:
         raise HTTPException(status_code=404, detail="State for service not found")
     return state
 
 @app.post("/api/entropy/reset")
-async def reset_entropy(store: StateStore = Depends(get_state_store), config: List[ServiceConfig] = Depends(get_service_config)):
+async def reset_entropy(
+    store: StateStore = Depends(get_state_store),
+    config: List[ServiceConfig] = Depends(get_service_config),
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
     """Resets the entropy state for all services."""
     logger.info("Resetting entropy state for all services")
     running_scenarios.clear()
     
     # First, reset the state store to prevent further entropy generation
-    for service in config:
-        store.set_state(service.id, {"latency": 0, "error_rate": 0})
+    await store.set_states({service.id: {"latency": 0, "error_rate": 0} for service in config})
     
-    # Then, reset each service with retries to handle existing entropy effects
-    for service in config:
-        for entropy_type, endpoint in service.entropy_endpoints.items():
-            target_url = f"{service.url}{endpoint}"
-            payload_key = "latency" if entropy_type == "latency" else "error_rate"
-            
-            # Retry up to 5 times to handle services that may be returning 500s due to entropy
-            max_retries = 5
-            for attempt in range(max_retries):
-                try:
-                    async with httpx.AsyncClient(timeout=5.0) as client:
-                        response = await client.post(target_url, json={payload_key: 0})
-                        response.raise_for_status()
-                        logger.info("Successfully reset entropy", service=service.id, type=entropy_type, attempt=attempt+1)
-                        break  # Success, exit retry loop
-                except (httpx.RequestError, httpx.HTTPStatusError) as e:
-                    if attempt < max_retries - 1:
-                        logger.warning("Retry entropy reset", service=service.id, type=entropy_type, attempt=attempt+1, error=str(e))
-                        await asyncio.sleep(0.1)  # Brief delay before retry
-                    else:
-                        logger.error("Failed to reset entropy after retries", service=service.id, type=entropy_type, error=str(e))
-                        # Continue with other services even if this one fails
-    
-    return JSONResponse(content={"message": "Entropy state for all services reset"}, status_code=200)
+    # Then, reset every service concurrently, retrying to handle existing entropy effects
+    pushed = [service for service in config if uses_push(entropy_publisher, service)]
+    posted = [service for service in config if not uses_push(entropy_publisher, service)]
+    reports = []
+    if pushed:
+        reports.append(await publish_reset(entropy_publisher, pushed))
+    if posted:
+        reports.append(await reset_services(
+            client,
+            posted,
+            concurrency=RESET_CONCURRENCY,
+            deadline_seconds=RESET_DEADLINE_SECONDS,
+            max_attempts=RESET_MAX_ATTEMPTS,
+        ))
+    report = {
+        "success": all(r["success"] for r in reports),
+        "duration_seconds": round(sum(r["duration_seconds"] for r in reports), 3),
+        "services": {service_id: result for r in reports for service_id, result in r["services"].items()},
+    }
+    logger.info("Entropy reset finished", success=report["success"], duration_seconds=report["duration_seconds"])
+
+    if report["success"]:
+        message = "Entropy state for all services reset"
+    else:
+        message = "Entropy state reset, but some services could not be reached"
+    return JSONResponse(content={"message": message, **report}, status_code=200 if report["success"] else 207)
 
 @app.get("/api/services", response_model=List[ServiceConfig])
 async def list_services(config: List[ServiceConfig] = Depends(get_service_config)):
@@ -159,10 +228,10 @@ async def list_services(config: List[ServiceConfig] = Depends(get_service_config
     return config
 
 @app.get("/api/scenarios", response_model=List[Scenario])
-async def list_scenarios(scenarios: List[Scenario] = Depends(get_scenarios)):
+async def list_scenarios(scenarios: ScenarioRegistry = Depends(get_scenarios)):
     """Returns a list of available scenarios."""
     logger.info("List scenarios endpoint called")
-    return scenarios
+    return scenarios.all()
 
 @app.get("/api/scenarios/status")
 async def get_scenario_status():
@@ -170,18 +239,27 @@ async def get_scenario_status():
     logger.info("Get scenario status endpoint called")
     return running_scenarios
 
+@app.get("/api/scenarios/{name}/timing")
+async def get_scenario_timing(name: str):
+    """Returns scheduled-vs-actual step start times for a scenario's most recent run."""
+    timing = scenario_timings.get(name)
+    if timing is None:
+        raise HTTPException(status_code=404, detail="No recorded run for scenario")
+    return timing
+
 @app.post("/api/scenarios/run")
 async def run_scenario(
     payload: ScenarioPayload,
     background_tasks: BackgroundTasks,
-    scenarios: List[Scenario] = Depends(get_scenarios),
+    scenarios: ScenarioRegistry = Depends(get_scenarios),
     store: StateStore = Depends(get_state_store),
     config: List[ServiceConfig] = Depends(get_service_config),
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
     """Runs a pre-defined chaos scenario."""
     logger.info("Run scenario endpoint called", scenario_name=payload.name)
 
-    scenario = next((s for s in scenarios if s.name == payload.name), None)
+    scenario = scenarios.get(payload.name)
     if not scenario:
         raise HTTPException(status_code=404, detail="Scenario not found")
 
@@ -190,6 +268,8 @@ async def run_scenario(
         scenario=scenario,
         store=store,
         config=config,
+        client=client,
+        publisher=entropy_publisher,
     )
     return JSONResponse(
         content={"message": f"Scenario '{payload.name}' started in the background"},
@@ -200,28 +280,27 @@ async def run_scenario(
 async def docker_control(payload: DockerPayload):
     """Controls Docker containers."""
     logger.info("Docker control endpoint called", payload=payload)
-    container = get_container(payload.service_id)
-    if not container:
+    try:
+        await docker_controller.perform(payload.service_id, payload.action, payload.params)
+    except ContainerNotFound:
         raise HTTPException(status_code=404, detail="Container not found")
-
-    if payload.action == "set_env":
-        for key, value in payload.params.items():
-            set_environment_variable(container, key, value)
-    elif payload.action == "set_resources":
-        update_resource_limits(container, **payload.params)
-    elif payload.action == "disconnect_network":
-        disconnect_network(container)
-    elif payload.action == "connect_network":
-        connect_network(container)
-    elif payload.action == "stop":
-        stop_container(container)
-    elif payload.action == "start":
-        start_container(container)
-    else:
+    except ValueError:
         raise HTTPException(status_code=400, detail="Invalid action")
 
     return {"message": f"Action '{payload.action}' performed on container '{payload.service_id}'"}
 
+@app.post("/api/docker/control/batch")
+async def docker_control_batch(payload: DockerBatchPayload):
+    """Performs the same Docker action on several containers concurrently."""
+    logger.info("Docker batch control endpoint called", payload=payload)
+    try:
+        results = await docker_controller.perform_many(payload.service_ids, payload.action, payload.params)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid action")
+
+    success = all(result["status"] == "ok" for result in results.values())
+    return JSONResponse(content={"success": success, "results": results}, status_code=200 if success else 207)
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
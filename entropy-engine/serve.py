@@ -0,0 +1,48 @@
+"""
+Runs the entropy engine under uvicorn with WEB_CONCURRENCY worker processes.
+
+    WEB_CONCURRENCY=4 STATE_STORE=redis python serve.py
+
+With more than one worker, metrics are written to PROMETHEUS_MULTIPROC_DIR
+and aggregated across workers on /metrics. Service state must live in Redis
+so every worker sees the same entropy; a scenario's progress is still only
+reported by the worker that runs it.
+
+The services' serve.py files follow the same pattern; keep them in step.
+"""
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+
+def prepare_workers() -> None:
+    """Points the workers at a fresh shared metrics directory; they inherit the environment."""
+    if os.environ.get("STATE_STORE", "memory") != "redis":
+        raise SystemExit("Running more than one worker needs STATE_STORE=redis")
+    metrics_dir = os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "workers", "metrics")
+    )
+    # Leftovers from before a restart would be summed into the new metrics
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def main() -> None:
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        prepare_workers()
+    uvicorn.run(
+        "main:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8000")),
+        workers=workers,
+        # uvloop and httptools, from uvicorn[standard]
+        loop="uvloop",
+        http="httptools",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from prometheus_client import Counter, Gauge, Histogram
+
+HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth",
+    "Password hash operations waiting for a worker",
+    multiprocess_mode="livesum"
+)
+HASH_IN_FLIGHT = Gauge(
+    "password_hash_in_flight",
+    "Password hash operations queued or running",
+    multiprocess_mode="livesum"
+)
+HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "Time a worker spends hashing or verifying a password",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0)
+)
+HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password hash operations shed because the queue was full",
+    ["operation"]
+)
+
+
+class HashingPoolFull(Exception):
+    """Raised when the hashing queue is full and the request should be shed."""
+
+
+class HashingPool:
+    """
+    Runs CPU-bound password hashing on a fixed set of worker threads.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism
+    without blocking the event loop. At most `max_queue` operations may wait for
+    a worker; beyond that, callers get HashingPoolFull so the service can answer
+    503 instead of building an unbounded backlog.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    async def run(self, operation: str, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                HASH_REJECTED.labels(operation=operation).inc()
+                raise HashingPoolFull(f"Password {operation} queue is full")
+            self._in_flight += 1
+        HASH_IN_FLIGHT.inc()
+        HASH_QUEUE_DEPTH.inc()
+
+        # Whoever acquires this first, the job starting or the caller giving
+        # up on it, takes the operation off the queue depth
+        dequeued = threading.Lock()
+        job = self._executor.submit(self._timed, dequeued, operation, fn, *args)
+        # The slot is held until the thread is done hashing, even if the
+        # caller was cancelled while it was running
+        job.add_done_callback(self._release)
+        try:
+            return await asyncio.wrap_future(job)
+        finally:
+            if dequeued.acquire(blocking=False):
+                HASH_QUEUE_DEPTH.dec()
+
+    def _release(self, _job) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        HASH_IN_FLIGHT.dec()
+
+    @staticmethod
+    def _timed(dequeued: threading.Lock, operation: str, fn, *args):
+        if dequeued.acquire(blocking=False):
+            HASH_QUEUE_DEPTH.dec()
+        start_time = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            HASH_DURATION.labels(operation=operation).observe(time.perf_counter() - start_time)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_default_workers = os.cpu_count() or 1
+hashing_pool = HashingPool(
+    workers=int(os.environ.get("PASSWORD_HASH_WORKERS", _default_workers)),
+    max_queue=int(os.environ.get("PASSWORD_HASH_QUEUE_SIZE", _default_workers * 4)),
+)
@@ -4,14 +4,19 @@ from pydantic import BaseModel
 from fastapi import Depends, FastAPI, HTTPException, status, Response
 from fastapi.security import OAuth2PasswordRequestForm
 import asyncio
+import os
 import random
 
 import security
+from hashing import HashingPoolFull, hashing_pool
 from models import Token, User
+from entropy_channel import create_entropy_subscriber, create_shared_entropy_file
+from prometheus_client import multiprocess
 from prometheus_fastapi_instrumentator import Instrumentator
 
 app = FastAPI()
 
+# Aggregates every worker's samples when PROMETHEUS_MULTIPROC_DIR is set
 Instrumentator().instrument(app).expose(app)
 
 # In-memory store for entropy state
@@ -25,6 +30,9 @@ class ErrorRatePayload(BaseModel):
 
 @app.middleware("http")
 async def entropy_middleware(request, call_next):
+    if shared_entropy is not None:
+        shared_entropy.sync()
+
     # Introduce latency
     if entropy_state["latency"] > 0:
         await asyncio.sleep(entropy_state["latency"])
@@ -36,20 +44,42 @@ async def entropy_middleware(request, call_next):
     response = await call_next(request)
     return response
 
+def apply_entropy(state):
+    """Replaces the entropy state in one step with a configuration pushed by the engine."""
+    entropy_state.update({key: state[key] for key in ("latency", "error_rate") if key in state})
+
+entropy_subscriber = create_entropy_subscriber("auth-api", apply_entropy)
+# Shares POSTed entropy between worker processes; None with a single worker
+shared_entropy = create_shared_entropy_file(apply_entropy)
+
 @app.post("/entropy/latency")
 async def set_latency(payload: LatencyPayload):
     entropy_state["latency"] = payload.latency
+    if shared_entropy is not None:
+        shared_entropy.publish({"latency": payload.latency})
     return {"message": f"Latency set to {payload.latency}"}
 
 @app.post("/entropy/errors")
 async def set_error_rate(payload: ErrorRatePayload):
     entropy_state["error_rate"] = payload.error_rate
+    if shared_entropy is not None:
+        shared_entropy.publish({"error_rate": payload.error_rate})
     return {"message": f"Error rate set to {payload.error_rate}"}
 
 @app.post("/token")
 async def login_for_access_token(response: Response, form_data: OAuth2PasswordRequestForm = Depends()):
-    user_in_db = security.get_user(security.fake_users_db, form_data.username)
-    if not user_in_db or not security.verify_password(form_data.password, user_in_db.hashed_password):
+    user_in_db = await security.get_user(form_data.username)
+    try:
+        password_ok = user_in_db is not None and await security.verify_password_async(
+            form_data.password, user_in_db.hashed_password
+        )
+    except HashingPoolFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, please retry",
+            headers={"Retry-After": "1"},
+        )
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -68,6 +98,23 @@ async def read_users_me(current_user: User = Depends(security.get_current_active
     return current_user
 
 
+@app.on_event("startup")
+async def startup_event():
+    if entropy_subscriber is not None:
+        entropy_subscriber.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    hashing_pool.shutdown()
+    await security.user_repository.close()
+    if entropy_subscriber is not None:
+        await entropy_subscriber.stop()
+    # Drop this worker's live gauges from the aggregate
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
@@ -6,7 +6,10 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
+from hashing import hashing_pool
 from models import User, UserInDB
+from token_cache import token_cache
+from users import create_user_repository
 
 SECRET_KEY = "your-secret-key"  # In a real app, this should be a secret
 ALGORITHM = "HS256"
@@ -27,22 +30,26 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
-# In-memory user database
-fake_users_db = {
-    "johndoe": {
-        "username": "johndoe",
-        "full_name": "John Doe",
-        "email": "johndoe@example.com",
-        "hashed_password": get_password_hash("secret"),
-        "disabled": False,
-    }
-}
+async def verify_password_async(plain_password, hashed_password):
+    """Verifies a password on the hashing pool instead of the event loop."""
+    return await hashing_pool.run("verify", pwd_context.verify, plain_password, hashed_password)
 
 
-def get_user(db, username: str):
-    if username in db:
-        user_dict = db[username]
-        return UserInDB(**user_dict)
+async def get_password_hash_async(password):
+    """Hashes a password on the hashing pool instead of the event loop."""
+    return await hashing_pool.run("hash", pwd_context.hash, password)
+
+
+user_repository = create_user_repository()
+
+
+async def get_user(username: str) -> Optional[UserInDB]:
+    return await user_repository.get_user(username)
+
+
+async def save_user(user: UserInDB) -> None:
+    await user_repository.save_user(user)
+    token_cache.invalidate_user(user.username)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -64,6 +71,9 @@ async def get_current_user(token: str = Depends(get_token_from_cookie)):
     )
     if token is None:
         raise credentials_exception
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -71,9 +81,10 @@ async def get_current_user(token: str = Depends(get_token_from_cookie)):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = get_user(fake_users_db, username=username)
+    user = await get_user(username)
     if user is None:
         raise credentials_exception
+    token_cache.put(token, user, payload["exp"])
     return user
 
 
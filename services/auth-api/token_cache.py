@@ -0,0 +1,90 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from prometheus_client import Counter, Gauge
+
+from models import UserInDB
+
+TOKEN_CACHE_REQUESTS = Counter(
+    "auth_token_cache_requests_total",
+    "Verified-token cache lookups by result",
+    ["result"]
+)
+TOKEN_CACHE_SIZE = Gauge(
+    "auth_token_cache_entries",
+    "Verified tokens currently cached",
+    multiprocess_mode="livesum"
+)
+
+
+class TokenCache:
+    """
+    A bounded LRU cache of tokens that have already been verified.
+
+    Entries are keyed by a SHA-256 digest so raw tokens are never kept in
+    memory, and they expire at the token's own `exp` or after `max_ttl`
+    seconds, whichever comes first. `invalidate_user` drops every cached token
+    of a user whose record changed.
+    """
+
+    def __init__(self, max_size: int = 10000, max_ttl: float = 300.0, clock=time.time):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[UserInDB, float]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[UserInDB]:
+        digest = self._digest(token)
+        entry = self._entries.get(digest)
+        if entry is None:
+            TOKEN_CACHE_REQUESTS.labels(result="miss").inc()
+            return None
+
+        user, expires_at = entry
+        if self._clock() >= expires_at:
+            self._remove(digest)
+            TOKEN_CACHE_REQUESTS.labels(result="miss").inc()
+            return None
+
+        self._entries.move_to_end(digest)
+        TOKEN_CACHE_REQUESTS.labels(result="hit").inc()
+        return user
+
+    def put(self, token: str, user: UserInDB, token_expires_at: float) -> None:
+        expires_at = min(token_expires_at, self._clock() + self.max_ttl)
+        digest = self._digest(token)
+        self._remove(digest)
+        self._entries[digest] = (user, expires_at)
+        self._by_user.setdefault(user.username, set()).add(digest)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+        TOKEN_CACHE_SIZE.set(len(self._entries))
+
+    def invalidate_user(self, username: str) -> None:
+        for digest in list(self._by_user.get(username, ())):
+            self._remove(digest)
+
+    def _remove(self, digest: str) -> None:
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        digests = self._by_user.get(entry[0].username)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_user[entry[0].username]
+        TOKEN_CACHE_SIZE.set(len(self._entries))
+
+
+token_cache = TokenCache(
+    max_size=int(os.environ.get("TOKEN_CACHE_MAX_SIZE", "10000")),
+    max_ttl=float(os.environ.get("TOKEN_CACHE_TTL_SECONDS", "300")),
+)
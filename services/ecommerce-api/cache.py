@@ -1,3 +1,281 @@
+import asyncio
+import json
+import math
+import os
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
 import redis
+import redis.asyncio as aioredis
+import structlog
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = structlog.get_logger()
+
+REDIS_POOL_IN_USE = Gauge(
+    "redis_pool_connections_in_use",
+    "Redis connections currently checked out of the pool",
+    multiprocess_mode="livesum"
+)
+REDIS_POOL_WAITING = Gauge(
+    "redis_pool_waiting_clients",
+    "Callers currently waiting for a free Redis connection",
+    multiprocess_mode="livesum"
+)
+REDIS_POOL_MAX = Gauge(
+    "redis_pool_max_connections",
+    "Configured size of the Redis connection pool",
+    multiprocess_mode="livesum"
+)
+REDIS_POOL_WAIT = Histogram(
+    "redis_pool_wait_seconds",
+    "Time spent waiting to check out a Redis connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+
+class InstrumentedConnectionPool(aioredis.BlockingConnectionPool):
+    """A fixed-size pool that waits up to `timeout` for a free connection and exports pool pressure."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._checked_out = set()
+        REDIS_POOL_MAX.set(self.max_connections)
+
+    async def get_connection(self, *args, **kwargs):
+        start_time = time.perf_counter()
+        REDIS_POOL_WAITING.inc()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        finally:
+            REDIS_POOL_WAITING.dec()
+            REDIS_POOL_WAIT.observe(time.perf_counter() - start_time)
+        self._checked_out.add(connection)
+        REDIS_POOL_IN_USE.set(len(self._checked_out))
+        return connection
+
+    async def release(self, connection):
+        # The base pool also releases connections that failed to connect
+        self._checked_out.discard(connection)
+        REDIS_POOL_IN_USE.set(len(self._checked_out))
+        await super().release(connection)
+
+
+redis_pool = InstrumentedConnectionPool(
+    host=os.environ.get("REDIS_HOST", "redis"),
+    port=int(os.environ.get("REDIS_PORT", "6379")),
+    db=0,
+    decode_responses=True,
+    max_connections=int(os.environ.get("REDIS_MAX_CONNECTIONS", "20")),
+    timeout=float(os.environ.get("REDIS_POOL_TIMEOUT_SECONDS", "1.0")),
+    socket_timeout=float(os.environ.get("REDIS_SOCKET_TIMEOUT_SECONDS", "0.5")),
+    socket_connect_timeout=float(os.environ.get("REDIS_CONNECT_TIMEOUT_SECONDS", "0.5")),
+)
+r = aioredis.Redis(connection_pool=redis_pool)
+
+INVALIDATION_CHANNEL = "cache-invalidation"
+
+CACHE_HITS = Counter(
+    "cache_hits_total",
+    "Cache hits by tier",
+    ["cache", "tier"]
+)
+CACHE_MISSES = Counter(
+    "cache_misses_total",
+    "Cache misses that loaded from the source of truth",
+    ["cache"]
+)
+CACHE_COALESCED = Counter(
+    "cache_coalesced_total",
+    "Cache misses that waited on an in-flight load instead of loading again",
+    ["cache"]
+)
+CACHE_STALE_SERVED = Counter(
+    "cache_stale_served_total",
+    "Stale cache entries served while revalidating in the background",
+    ["cache"]
+)
+
+
+class TieredCache:
+    """
+    A read-through cache with an in-process L1 in front of Redis (L2).
+
+    Concurrent misses for the same key are coalesced into a single load, entries
+    expire after a jittered TTL so replicas do not refresh in lockstep, and
+    expired entries are served for a further `stale_ttl` seconds while one
+    background load refreshes them. Invalidations are broadcast over Redis
+    pub/sub so every replica drops its L1 copy.
+    """
+
+    def __init__(self, client: aioredis.Redis, ttl: float = 60.0, stale_ttl: float = 300.0, jitter: float = 0.1):
+        self.client = client
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.jitter = jitter
+        self._local: Dict[str, Tuple[Any, float, float]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Bumped by every invalidation, so a load that started before one
+        # doesn't write back the value it invalidated
+        self._generations: Dict[str, int] = {}
+        self._background = set()
+        self._node_id = uuid.uuid4().hex
+        self._listener = None
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Returns the cached value for `key`, calling `loader` on a miss."""
+        now = time.time()
+
+        entry = self._local.get(key)
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                CACHE_HITS.labels(cache=key, tier="l1").inc()
+                return value
+            if now < stale_until:
+                self._revalidate(key, loader)
+                return value
+            self._local.pop(key, None)
+
+        try:
+            raw = await self.client.get(key)
+        except redis.RedisError as e:
+            logger.warning("cache_read_failed", key=key, error=str(e))
+            raw = None
+        if raw is not None:
+            envelope = json.loads(raw)
+            value, fresh_until, stale_until = envelope["value"], envelope["fresh_until"], envelope["stale_until"]
+            self._local[key] = (value, fresh_until, stale_until)
+            if now < fresh_until:
+                CACHE_HITS.labels(cache=key, tier="l2").inc()
+                return value
+            self._revalidate(key, loader)
+            return value
+
+        return await self._load(key, loader)
+
+    async def invalidate(self, key: str) -> None:
+        """Drops `key` from both tiers and tells other replicas to do the same."""
+        self._drop(key)
+        try:
+            await self.client.delete(key)
+            await self.client.publish(INVALIDATION_CHANNEL, json.dumps({"key": key, "origin": self._node_id}))
+        except redis.RedisError as e:
+            logger.warning("cache_invalidation_failed", key=key, error=str(e))
+
+    def start_invalidation_listener(self) -> None:
+        """Subscribes to invalidations published by other replicas."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop_invalidation_listener(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        self._handle_invalidation(message)
+            except redis.RedisError as e:
+                # Entries still expire by TTL while the subscription is down
+                logger.warning("cache_invalidation_listener_failed", error=str(e))
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+    def _handle_invalidation(self, message) -> None:
+        payload = json.loads(message["data"])
+        if payload.get("origin") != self._node_id:
+            self._drop(payload["key"])
+
+    def _drop(self, key: str) -> None:
+        self._generations[key] = self._generations.get(key, 0) + 1
+        self._local.pop(key, None)
+        # Later misses start a fresh load instead of joining the stale one
+        self._inflight.pop(key, None)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            CACHE_COALESCED.labels(cache=key).inc()
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leading request was cancelled, not this one; load again
+                return await self._load(key, loader)
+
+        CACHE_MISSES.labels(cache=key).inc()
+        return await self._fill(key, loader, self._begin(key))
+
+    def _revalidate(self, key: str, loader: Callable[[], Awaitable[Any]]) -> None:
+        """Refreshes a stale entry in the background, at most once at a time per key."""
+        CACHE_STALE_SERVED.labels(cache=key).inc()
+        if key in self._inflight:
+            return
+        task = asyncio.create_task(self._fill(key, loader, self._begin(key)))
+        self._background.add(task)
+        task.add_done_callback(self._on_revalidated)
+
+    def _begin(self, key: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        return future
+
+    async def _fill(self, key: str, loader: Callable[[], Awaitable[Any]], future: asyncio.Future) -> Any:
+        generation = self._generations.get(key, 0)
+        try:
+            value = await loader()
+            if self._generations.get(key, 0) == generation:
+                await self._store(key, value)
+        except asyncio.CancelledError:
+            # Waiters see the cancelled future and load for themselves
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _on_revalidated(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("cache_revalidation_failed", error=str(task.exception()))
+
+    async def _store(self, key: str, value: Any) -> None:
+        now = time.time()
+        fresh_until = now + self.ttl * random.uniform(1 - self.jitter, 1 + self.jitter)
+        stale_until = fresh_until + self.stale_ttl
+        self._local[key] = (value, fresh_until, stale_until)
+        envelope = {"value": value, "fresh_until": fresh_until, "stale_until": stale_until}
+        try:
+            await self.client.set(key, json.dumps(envelope), ex=math.ceil(stale_until - now))
+        except redis.RedisError as e:
+            logger.warning("cache_write_failed", key=key, error=str(e))
+
 
-r = redis.Redis(host='redis', port=6379, db=0, decode_responses=True)
+product_cache = TieredCache(
+    r,
+    ttl=float(os.environ.get("PRODUCT_CACHE_TTL_SECONDS", "60")),
+    stale_ttl=float(os.environ.get("PRODUCT_CACHE_STALE_SECONDS", "300")),
+)
@@ -0,0 +1,86 @@
+import asyncio
+import math
+import random
+from statistics import NormalDist
+from typing import Optional
+
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "pareto")
+
+_STANDARD_NORMAL = NormalDist()
+
+
+def _z(percentile: float) -> float:
+    """Returns the standard normal quantile for a percentile in (0, 1)."""
+    return _STANDARD_NORMAL.inv_cdf(percentile)
+
+
+def sample_latency(
+    latency: float,
+    distribution: str = "fixed",
+    jitter: float = 0.0,
+    tail_alpha: float = 2.0,
+    percentile: Optional[float] = None,
+    rng: random.Random = random,
+) -> float:
+    """
+    Draws a single latency value (in seconds) from the configured distribution.
+
+    `latency` is the typical value: the constant for "fixed", the centre for
+    "uniform" and "normal", the median for "lognormal" and the minimum for
+    "pareto". When `percentile` is set (e.g. 0.99), `latency` is instead the
+    value that fraction of requests should stay under, and the distribution's
+    location is solved so that its quantile lands on it ("p99 = 1s").
+
+    `jitter` is the half-width for "uniform", the standard deviation (seconds)
+    for "normal" and the log-space sigma for "lognormal". `tail_alpha` is the
+    Pareto shape; smaller values give heavier tails.
+    """
+    if latency <= 0:
+        return 0.0
+
+    if distribution == "fixed":
+        value = latency
+    elif distribution == "uniform":
+        centre = latency
+        if percentile is not None:
+            # Quantile of U(c - j, c + j) is c - j + 2j * p
+            centre = latency - jitter * (2 * percentile - 1)
+        value = rng.uniform(centre - jitter, centre + jitter)
+    elif distribution == "normal":
+        mean = latency
+        if percentile is not None:
+            mean = latency - jitter * _z(percentile)
+        value = rng.gauss(mean, jitter)
+    elif distribution == "lognormal":
+        mu = math.log(latency)
+        if percentile is not None:
+            mu -= jitter * _z(percentile)
+        value = rng.lognormvariate(mu, jitter)
+    elif distribution == "pareto":
+        scale = latency
+        if percentile is not None:
+            # Quantile of Pareto(x_m, a) is x_m * (1 - p) ** (-1 / a)
+            scale = latency * (1 - percentile) ** (1 / tail_alpha)
+        value = scale * rng.paretovariate(tail_alpha)
+    else:
+        raise ValueError(f"Unknown latency distribution: {distribution}")
+
+    return max(value, 0.0)
+
+
+async def inject_latency(settings) -> float:
+    """
+    Sleeps for a latency sampled from `settings` without blocking the event loop.
+
+    Returns the injected delay so callers can record it.
+    """
+    delay = sample_latency(
+        settings.latency,
+        distribution=settings.latency_distribution,
+        jitter=settings.latency_jitter,
+        tail_alpha=settings.latency_tail_alpha,
+        percentile=settings.latency_percentile,
+    )
+    if delay > 0:
+        await asyncio.sleep(delay)
+    return delay
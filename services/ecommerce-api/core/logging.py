@@ -1,5 +1,41 @@
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+import orjson
 import structlog
 from opentelemetry import trace
+from prometheus_client import Counter, Gauge
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", "256"))
+# Fraction of successful, fast requests that get a log line
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get("REQUEST_LOG_SAMPLE_RATE", "0.1"))
+# Requests at least this slow are always logged
+REQUEST_LOG_SLOW_SECONDS = float(os.environ.get("REQUEST_LOG_SLOW_SECONDS", "0.5"))
+# Responses with this status or above are always logged
+REQUEST_LOG_ALWAYS_STATUS = int(os.environ.get("REQUEST_LOG_ALWAYS_STATUS", "400"))
+
+LOG_RECORDS = Counter(
+    "log_records_total",
+    "Log records by what happened to them: queued, dropped because the queue was full, or sampled out",
+    ["result"]
+)
+LOG_RECORDS_WRITTEN = Counter(
+    "log_records_written_total",
+    "Log records written out by the background writer"
+)
+LOG_QUEUE_DEPTH = Gauge(
+    "log_queue_depth",
+    "Log records waiting for the background writer",
+    multiprocess_mode="livesum"
+)
+
 
 def add_opentelemetry_context(logger, method_name, event_dict):
     """
@@ -11,3 +47,131 @@ def add_opentelemetry_context(logger, method_name, event_dict):
         event_dict["trace_id"] = format(span_context.trace_id, "032x")
         event_dict["span_id"] = format(span_context.span_id, "016x")
     return event_dict
+
+
+class QueueLogWriter:
+    """
+    Writes log records as JSON lines from a background thread.
+
+    Loggers only put the event dict on a bounded queue; encoding with orjson
+    and the write itself happen on the writer thread, in batches. When the
+    queue is full the record is dropped and counted, so a slow stdout never
+    blocks the event loop.
+    """
+
+    def __init__(self, stream=None, max_size: int = LOG_QUEUE_SIZE, batch_size: int = LOG_BATCH_SIZE):
+        self.stream = stream if stream is not None else sys.stdout.buffer
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_size)
+        self._queued = LOG_RECORDS.labels(result="queued")
+        self._dropped = LOG_RECORDS.labels(result="dropped")
+        self._thread: Optional[threading.Thread] = None
+
+    def put(self, event_dict: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(event_dict)
+        except queue.Full:
+            self._dropped.inc()
+            return
+        self._queued.inc()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Writes out the records already queued, then stops the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None, timeout=timeout)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            records = [self._queue.get()]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in records
+            if stopping:
+                records = records[:records.index(None)]
+            self._write(records)
+            LOG_QUEUE_DEPTH.set(self._queue.qsize())
+            if stopping:
+                return
+
+    def _write(self, records) -> None:
+        lines = b"".join(
+            orjson.dumps(record, default=str, option=orjson.OPT_APPEND_NEWLINE) for record in records
+        )
+        try:
+            self.stream.write(lines)
+            self.stream.flush()
+        except (OSError, ValueError):
+            # Nowhere left to report it; count the batch as lost
+            self._dropped.inc(len(records))
+            return
+        LOG_RECORDS_WRITTEN.inc(len(records))
+
+
+class QueueLogger:
+    """A structlog logger that hands each finished event dict to a QueueLogWriter."""
+
+    def __init__(self, writer: QueueLogWriter):
+        self.writer = writer
+
+    def msg(self, event_dict: Dict[str, Any]) -> None:
+        self.writer.put(event_dict)
+
+    debug = info = warning = warn = error = critical = exception = fatal = log = msg
+
+
+def enqueue(logger, method_name, event_dict):
+    """Final processor: passes the event dict through unrendered, to be encoded on the writer thread."""
+    return (event_dict,), {}
+
+
+def configure_logging(writer: QueueLogWriter) -> None:
+    """Routes every structlog logger through `writer`, dropping records below LOG_LEVEL early."""
+    structlog.configure(
+        processors=[
+            structlog.processors.TimeStamper(fmt="iso"),
+            structlog.processors.add_log_level,
+            add_opentelemetry_context,
+            structlog.processors.format_exc_info,
+            enqueue,
+        ],
+        logger_factory=lambda *args: QueueLogger(writer),
+        wrapper_class=structlog.make_filtering_bound_logger(getattr(logging, LOG_LEVEL, logging.INFO)),
+        cache_logger_on_first_use=True,
+    )
+
+
+class RequestLogSampler:
+    """
+    Decides which requests get a log line.
+
+    Errors, meaning any status from `always_status` up (client and server
+    errors by default), and requests slower than `slow_seconds` are always
+    kept; other requests are kept with probability `rate`. The rate a kept
+    line was sampled at is returned so counts can be re-weighted downstream.
+    """
+
+    def __init__(self, rate: float = REQUEST_LOG_SAMPLE_RATE, slow_seconds: float = REQUEST_LOG_SLOW_SECONDS,
+                 always_status: int = REQUEST_LOG_ALWAYS_STATUS):
+        self.rate = rate
+        self.slow_seconds = slow_seconds
+        self.always_status = always_status
+        self._sampled_out = LOG_RECORDS.labels(result="sampled_out")
+
+    def sample(self, status_code: int, duration: float) -> Optional[float]:
+        """Returns the sample rate to record with the line, or None to skip logging it."""
+        if status_code >= self.always_status or duration >= self.slow_seconds:
+            return 1.0
+        if random.random() < self.rate:
+            return self.rate
+        self._sampled_out.inc()
+        return None
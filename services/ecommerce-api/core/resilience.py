@@ -0,0 +1,208 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+from prometheus_client import Counter
+from starlette.requests import Request
+
+# Milliseconds the caller is still willing to wait; read from incoming
+# requests and set on outgoing ones
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+DOWNSTREAM_ATTEMPTS = Counter(
+    "downstream_attempts_total",
+    "Calls sent to a downstream service, by whether they were the first attempt, a retry or a hedge",
+    ["downstream", "kind"]
+)
+DOWNSTREAM_RETRIES_DENIED = Counter(
+    "downstream_retries_denied_total",
+    "Retries and hedges not sent because the retry budget or the deadline ran out",
+    ["downstream", "reason"]
+)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """The time left to answer a request, handed down to every call made while answering it."""
+
+    def __init__(self, seconds: float, clock=time.monotonic):
+        self._clock = clock
+        self.expires_at = clock() + seconds
+
+    @classmethod
+    def from_request(cls, request: Request, default_seconds: float) -> "Deadline":
+        """Uses the caller's deadline when it sent a tighter one than `default_seconds`."""
+        seconds = default_seconds
+        header = request.headers.get(DEADLINE_HEADER)
+        if header is not None:
+            try:
+                seconds = min(seconds, int(header) / 1000)
+            except ValueError:
+                pass
+        return cls(seconds)
+
+    def remaining(self) -> float:
+        return max(self.expires_at - self._clock(), 0.0)
+
+    def headers(self) -> Dict[str, str]:
+        return {DEADLINE_HEADER: str(int(self.remaining() * 1000))}
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of traffic.
+
+    Every first attempt deposits `ratio` tokens and every retry or hedge
+    withdraws one, so over time at most `ratio` extra calls are made per
+    request. The balance is capped at `max_tokens`, which bounds the burst
+    allowed after a quiet period. When a downstream fails outright the
+    budget drains and callers stop multiplying its load.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LatencyTracker:
+    """Estimates a latency quantile over the last `window` successful calls."""
+
+    def __init__(self, quantile: float = 0.95, window: int = 1000, min_samples: int = 50, recompute_every: int = 50):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.recompute_every = recompute_every
+        self._samples = deque(maxlen=window)
+        self._since_recompute = 0
+        self._value: Optional[float] = None
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._since_recompute += 1
+        if self._since_recompute >= self.recompute_every and len(self._samples) >= self.min_samples:
+            ordered = sorted(self._samples)
+            self._value = ordered[min(int(len(ordered) * self.quantile), len(ordered) - 1)]
+            self._since_recompute = 0
+
+    def value(self) -> Optional[float]:
+        """Returns the estimate, or None until enough calls have been observed."""
+        return self._value
+
+
+class ResilientCaller:
+    """
+    Calls a downstream with retries bounded by a deadline and a retry budget, optionally hedged.
+
+    `send` is given the request's Deadline and should pass its remaining
+    time on as the call's timeout and headers. Transport errors and 5xx
+    responses are retried up to `max_attempts` with jittered exponential
+    backoff, but only while the deadline leaves time for the backoff and the
+    budget allows it. With `hedge`, a second copy of an attempt is sent once
+    it has run longer than the tracked latency quantile, and whichever
+    answers successfully first wins. Hedges draw on the same budget.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_attempts: int = 3,
+        budget: Optional[RetryBudget] = None,
+        hedge: bool = False,
+        latency: Optional[LatencyTracker] = None,
+        base_backoff: float = 0.05,
+    ):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.budget = budget if budget is not None else RetryBudget()
+        self.hedge = hedge
+        self.latency = latency if latency is not None else LatencyTracker()
+        self.base_backoff = base_backoff
+        self._first = DOWNSTREAM_ATTEMPTS.labels(downstream=name, kind="first")
+        self._retry = DOWNSTREAM_ATTEMPTS.labels(downstream=name, kind="retry")
+        self._hedged = DOWNSTREAM_ATTEMPTS.labels(downstream=name, kind="hedge")
+        self._denied_budget = DOWNSTREAM_RETRIES_DENIED.labels(downstream=name, reason="budget")
+        self._denied_deadline = DOWNSTREAM_RETRIES_DENIED.labels(downstream=name, reason="deadline")
+
+    async def call(self, send: Callable[[Deadline], Awaitable[httpx.Response]], deadline: Deadline) -> httpx.Response:
+        self.budget.deposit()
+        self._first.inc()
+        attempt = 0
+        while True:
+            if deadline.remaining() <= 0:
+                raise DeadlineExceeded(f"No time left to call {self.name}")
+            error, response = None, None
+            try:
+                response = await self._attempt(send, deadline)
+                if response.status_code < 500:
+                    return response
+            except httpx.TransportError as e:
+                error = e
+
+            attempt += 1
+            if attempt >= self.max_attempts:
+                break
+            backoff = random.uniform(0, self.base_backoff * 2 ** attempt)
+            if deadline.remaining() <= backoff:
+                self._denied_deadline.inc()
+                break
+            if not self.budget.withdraw():
+                self._denied_budget.inc()
+                break
+            self._retry.inc()
+            await asyncio.sleep(backoff)
+
+        if error is not None:
+            raise error
+        return response
+
+    async def _timed(self, send, deadline: Deadline) -> httpx.Response:
+        start = time.perf_counter()
+        response = await send(deadline)
+        if response.status_code < 500:
+            self.latency.observe(time.perf_counter() - start)
+        return response
+
+    async def _attempt(self, send, deadline: Deadline) -> httpx.Response:
+        pending = {asyncio.ensure_future(self._timed(send, deadline))}
+        try:
+            hedge_delay = self.latency.value() if self.hedge else None
+            if hedge_delay is not None and hedge_delay < deadline.remaining():
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done:
+                    if self.budget.withdraw():
+                        self._hedged.inc()
+                        pending.add(asyncio.ensure_future(self._timed(send, deadline)))
+                    else:
+                        self._denied_budget.inc()
+
+            while True:
+                # httpx applies its timeout to each phase of a call, not to the whole call
+                done, pending = await asyncio.wait(
+                    pending, timeout=deadline.remaining(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise DeadlineExceeded(f"{self.name} did not answer within the deadline")
+                for task in done:
+                    if task.exception() is None and task.result().status_code < 500:
+                        return task.result()
+                if not pending:
+                    # Every copy failed; report the last one
+                    return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
@@ -1,30 +1,220 @@
 import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import (
+    ALWAYS_OFF, Decision, ParentBased, Sampler, SamplingResult, TraceIdRatioBased,
+)
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+from opentelemetry.trace import SpanContext, StatusCode, TraceFlags
+from prometheus_client import Counter
+
+# Fraction of traces kept up front; the standard OTEL_TRACES_SAMPLER_ARG variable
+TRACE_SAMPLE_RATIO = float(os.environ.get("OTEL_TRACES_SAMPLER_ARG", "0.1"))
+# Whether traces the head sampler skipped are still kept when they fail or are slow
+TRACE_TAIL_SAMPLING = os.environ.get("TRACE_TAIL_SAMPLING", "true").lower() == "true"
+TRACE_TAIL_SLOW_SECONDS = float(os.environ.get("TRACE_TAIL_SLOW_SECONDS", "0.5"))
+# Traces buffered while waiting for their root span to end
+TRACE_TAIL_MAX_TRACES = int(os.environ.get("TRACE_TAIL_MAX_TRACES", "2048"))
+TRACE_EXPORT_TIMEOUT_SECONDS = float(os.environ.get("TRACE_EXPORT_TIMEOUT_SECONDS", "2"))
+TRACE_EXPORT_BACKOFF_MAX_SECONDS = float(os.environ.get("TRACE_EXPORT_BACKOFF_MAX_SECONDS", "60"))
+
+TRACE_TAIL_DECISIONS = Counter(
+    "trace_tail_decisions_total",
+    "Traces the head sampler skipped, by what the tail sampler did with them",
+    ["decision"]
+)
+TRACE_EXPORT_SPANS = Counter(
+    "trace_export_spans_total",
+    "Spans handed to the exporter by outcome; skipped means the exporter was backing off",
+    ["result"]
+)
+
+
+class HeadSampler(Sampler):
+    """
+    Samples `ratio` of new traces and follows the parent's decision otherwise.
+
+    With `record_unsampled`, traces that aren't sampled are still recorded
+    (but not flagged as sampled downstream) so TailSamplingProcessor can
+    keep the ones that turn out to fail or be slow.
+    """
+
+    def __init__(self, ratio: float, record_unsampled: bool):
+        self._sampler = ParentBased(TraceIdRatioBased(ratio))
+        self.record_unsampled = record_unsampled
+
+    def should_sample(self, parent_context: Optional[Context], trace_id: int, name: str, kind=None,
+                      attributes=None, links=None, trace_state=None) -> SamplingResult:
+        result = self._sampler.should_sample(parent_context, trace_id, name, kind, attributes, links, trace_state)
+        if result.decision == Decision.DROP and self.record_unsampled:
+            return SamplingResult(Decision.RECORD_ONLY, result.attributes, result.trace_state)
+        return result
+
+    def get_description(self) -> str:
+        return f"HeadSampler{{{self._sampler.get_description()}, record_unsampled={self.record_unsampled}}}"
+
+
+def _as_sampled(span: ReadableSpan) -> ReadableSpan:
+    """Copies a recorded span with the sampled flag set, so export processors accept it."""
+    context = span.context
+    return ReadableSpan(
+        name=span.name,
+        context=SpanContext(context.trace_id, context.span_id, context.is_remote,
+                            TraceFlags(TraceFlags.SAMPLED), context.trace_state),
+        parent=span.parent,
+        resource=span.resource,
+        attributes=span.attributes,
+        events=span.events,
+        links=span.links,
+        kind=span.kind,
+        status=span.status,
+        start_time=span.start_time,
+        end_time=span.end_time,
+        instrumentation_scope=span.instrumentation_scope,
+    )
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """
+    Forwards head-sampled spans to `delegate` and decides on the rest once their trace ends.
+
+    Spans of unsampled traces are buffered per trace until the trace's local
+    root span ends. The trace is then forwarded if any span errored or the
+    root took at least `slow_seconds`, and discarded otherwise. At most
+    `max_traces` traces are buffered; the oldest is evicted beyond that.
+    """
+
+    def __init__(self, delegate: SpanProcessor, slow_seconds: float = TRACE_TAIL_SLOW_SECONDS,
+                 max_traces: int = TRACE_TAIL_MAX_TRACES):
+        self.delegate = delegate
+        self.slow_ns = int(slow_seconds * 1e9)
+        self.max_traces = max_traces
+        self._pending: "OrderedDict[int, List[ReadableSpan]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span, parent_context: Optional[Context] = None) -> None:
+        self.delegate.on_start(span, parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if span.context.trace_flags.sampled:
+            self.delegate.on_end(span)
+            return
+
+        trace_id = span.context.trace_id
+        is_local_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            spans = self._pending.pop(trace_id, [])
+            spans.append(span)
+            if not is_local_root:
+                self._pending[trace_id] = spans
+                if len(self._pending) > self.max_traces:
+                    self._pending.popitem(last=False)
+                    TRACE_TAIL_DECISIONS.labels(decision="evicted").inc()
+                return
+
+        decision = self._decide(span, spans)
+        TRACE_TAIL_DECISIONS.labels(decision=decision).inc()
+        if decision != "dropped":
+            for pending_span in spans:
+                self.delegate.on_end(_as_sampled(pending_span))
+
+    def _decide(self, root: ReadableSpan, spans: Sequence[ReadableSpan]) -> str:
+        if any(span.status.status_code == StatusCode.ERROR for span in spans):
+            return "kept_error"
+        if root.end_time - root.start_time >= self.slow_ns:
+            return "kept_slow"
+        return "dropped"
+
+    def shutdown(self) -> None:
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
+
+
+class BackoffSpanExporter(SpanExporter):
+    """
+    Wraps an exporter so an unreachable collector costs almost nothing.
+
+    After a failed export, batches are dropped without calling the exporter
+    for a delay that doubles on each consecutive failure, up to
+    `max_backoff` seconds. The first successful export resets it.
+    """
+
+    def __init__(self, exporter: SpanExporter, base_backoff: float = 1.0,
+                 max_backoff: float = TRACE_EXPORT_BACKOFF_MAX_SECONDS, clock=time.monotonic):
+        self.exporter = exporter
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        if self._clock() < self._retry_at:
+            TRACE_EXPORT_SPANS.labels(result="skipped").inc(len(spans))
+            return SpanExportResult.FAILURE
+        try:
+            result = self.exporter.export(spans)
+        except Exception:
+            result = SpanExportResult.FAILURE
+        if result == SpanExportResult.SUCCESS:
+            self._failures = 0
+            TRACE_EXPORT_SPANS.labels(result="exported").inc(len(spans))
+        else:
+            self._failures += 1
+            self._retry_at = self._clock() + min(self.base_backoff * 2 ** (self._failures - 1), self.max_backoff)
+            TRACE_EXPORT_SPANS.labels(result="failed").inc(len(spans))
+        return result
+
+    def shutdown(self) -> None:
+        self.exporter.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.exporter.force_flush(timeout_millis)
+
 
 def init_tracer(app):
     """
     Initializes the OpenTelemetry tracer and instruments the FastAPI application.
+
+    Batch sizes and delays are tuned with the standard OTEL_BSP_* variables.
+    OTEL_TRACES_EXPORTER=none turns exporting, and span recording, off.
     """
     service_name = os.environ.get("OTEL_SERVICE_NAME", "ecommerce-api")
     otlp_endpoint = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "http://jaeger:4317")
-    
+    exporter_name = os.environ.get("OTEL_TRACES_EXPORTER", "otlp")
+
     resource = Resource(attributes={"service.name": service_name})
 
-    provider = TracerProvider(resource=resource)
+    if exporter_name == "none":
+        provider = TracerProvider(resource=resource, sampler=ALWAYS_OFF)
+    else:
+        provider = TracerProvider(
+            resource=resource,
+            sampler=HeadSampler(TRACE_SAMPLE_RATIO, record_unsampled=TRACE_TAIL_SAMPLING),
+        )
+        otlp_exporter = OTLPSpanExporter(
+            endpoint=otlp_endpoint,
+            insecure=True,
+            timeout=TRACE_EXPORT_TIMEOUT_SECONDS,
+        )
+        processor = BatchSpanProcessor(BackoffSpanExporter(otlp_exporter))
+        if TRACE_TAIL_SAMPLING:
+            processor = TailSamplingProcessor(processor)
+        provider.add_span_processor(processor)
     trace.set_tracer_provider(provider)
 
-    otlp_exporter = OTLPSpanExporter(
-        endpoint=otlp_endpoint,
-        insecure=True
-    )
-    provider.add_span_processor(BatchSpanProcessor(otlp_exporter))
-
     # Instrument FastAPI and httpx
     FastAPIInstrumentor.instrument_app(app, tracer_provider=provider)
     HTTPXClientInstrumentor().instrument()
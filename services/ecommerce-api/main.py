@@ -1,38 +1,35 @@
+import os
 import time
 import random
 import asyncio
 import httpx
-import json
-from fastapi import FastAPI, Request, HTTPException, Depends
-from pydantic import BaseModel
-from prometheus_client import make_asgi_app, Counter, Histogram
-from sqlalchemy.orm import Session
-from tenacity import retry, stop_after_attempt, wait_exponential, RetryError
+from typing import List, Optional
+from fastapi import FastAPI, Request, Response, HTTPException, Depends, Query
+from pydantic import BaseModel, Field
+from prometheus_client import Counter, Histogram
+from sqlalchemy import func, insert, literal_column, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from pybreaker import CircuitBreaker, CircuitBreakerError
 
 import models
 import database
-from cache import r
+from cache import r, product_cache
 from core.tracing import init_tracer
-from core.logging import add_opentelemetry_context
+from core.logging import QueueLogWriter, RequestLogSampler, configure_logging
+from core.latency import DISTRIBUTIONS, inject_latency
+from core.http_client import create_http_client
+from core.resilience import Deadline, DeadlineExceeded, LatencyTracker, ResilientCaller, RetryBudget
+from core.entropy_channel import create_entropy_subscriber, create_shared_entropy_file
+from core.metrics import BoundMetric, make_metrics_app, mark_worker_stopped, request_method, route_template
 import structlog
 from opentelemetry import trace
 
-models.Base.metadata.create_all(bind=database.engine)
-
 # --- Structlog Configuration ---
-structlog.configure(
-    processors=[
-        structlog.stdlib.filter_by_level,
-        structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.add_log_level,
-        add_opentelemetry_context,
-        structlog.processors.JSONRenderer(),
-    ],
-    logger_factory=structlog.stdlib.LoggerFactory(),
-    wrapper_class=structlog.stdlib.BoundLogger,
-    cache_logger_on_first_use=True,
-)
+# Records are queued and written by a background thread; see core/logging.py
+log_writer = QueueLogWriter()
+configure_logging(log_writer)
+request_log_sampler = RequestLogSampler()
 logger = structlog.get_logger()
 
 app = FastAPI()
@@ -42,19 +39,46 @@ init_tracer(app)
 tracer = trace.get_tracer(__name__)
 
 # --- Service Clients ---
-payment_api_client = httpx.AsyncClient(base_url="http://payment-api:8000")
+payment_api_client = create_http_client("payment-api", base_url="http://payment-api:8000")
 
 # --- Circuit Breaker ---
 payment_breaker = CircuitBreaker(fail_max=5, reset_timeout=60)
 
+# --- Payment Call Policy ---
+# Checkout answers within this long, however many payment attempts it takes
+CHECKOUT_DEADLINE_SECONDS = float(os.environ.get("CHECKOUT_DEADLINE_SECONDS", "3"))
+payment_caller = ResilientCaller(
+    "payment-api",
+    max_attempts=int(os.environ.get("PAYMENT_MAX_ATTEMPTS", "3")),
+    budget=RetryBudget(ratio=float(os.environ.get("PAYMENT_RETRY_BUDGET_RATIO", "0.1"))),
+    # Hedging sends /authorize twice for slow calls; off by default as
+    # payment-api doesn't deduplicate authorizations
+    hedge=os.environ.get("PAYMENT_HEDGING", "false").lower() == "true",
+    latency=LatencyTracker(quantile=float(os.environ.get("PAYMENT_HEDGE_QUANTILE", "0.95"))),
+)
+
 # --- Entropy State ---
 class EntropySettings(BaseModel):
     latency: float = 0.05
+    latency_distribution: str = "fixed"  # fixed, uniform, normal, lognormal, pareto
+    latency_jitter: float = 0.0
+    latency_tail_alpha: float = 2.0
+    latency_percentile: Optional[float] = None  # e.g. 0.99 means "p99 = latency"
     error_rate: float = 0.0
     throughput: float = 1.0  # as a percentage of normal
 
 entropy_settings = EntropySettings()
 
+def apply_entropy(state):
+    """Applies a configuration pushed by the engine to the entropy settings in one step."""
+    for key, value in state.items():
+        if key in EntropySettings.model_fields:
+            setattr(entropy_settings, key, value)
+
+entropy_subscriber = create_entropy_subscriber("ecommerce-api", apply_entropy)
+# Shares POSTed entropy between worker processes; None with a single worker
+shared_entropy = create_shared_entropy_file(apply_entropy)
+
 # --- Metrics Definitions ---
 REQUEST_COUNT = Counter(
     "http_requests_total",
@@ -66,9 +90,12 @@ REQUEST_LATENCY = Histogram(
     'HTTP request latency',
     ['method', 'endpoint']
 )
+# Labelled by route template, with pre-bound children
+request_count = BoundMetric(REQUEST_COUNT)
+request_latency = BoundMetric(REQUEST_LATENCY)
 
 # Mount the Prometheus metrics app
-metrics_app = make_asgi_app()
+metrics_app = make_metrics_app()
 app.mount("/metrics", metrics_app)
 
 # --- Middleware for Metrics & Entropy ---
@@ -77,50 +104,58 @@ async def track_metrics_and_inject_entropy(request: Request, call_next):
     # Skip entropy for metrics and entropy endpoints
     if request.url.path in ["/metrics", "/entropy/latency", "/entropy/errors", "/entropy/throughput"]:
         return await call_next(request)
+    if shared_entropy is not None:
+        shared_entropy.sync()
 
     start_time = time.time()
+    method = request_method(request)
 
     # Inject latency
-    time.sleep(entropy_settings.latency)
+    await inject_latency(entropy_settings)
 
     # Inject errors
     if random.random() < entropy_settings.error_rate:
-        REQUEST_COUNT.labels(method=request.method, endpoint=request.url.path, http_status=500).inc()
-        end_time = time.time()
-        REQUEST_LATENCY.labels(method=request.method, endpoint=request.url.path).observe(end_time - start_time)
+        endpoint = route_template(request)
+        request_count.labels(method, endpoint, 500).inc()
+        request_latency.labels(method, endpoint).observe(time.time() - start_time)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
     # Throttle throughput
     if random.random() > entropy_settings.throughput:
-        REQUEST_COUNT.labels(method=request.method, endpoint=request.url.path, http_status=429).inc()
-        end_time = time.time()
-        REQUEST_LATENCY.labels(method=request.method, endpoint=request.url.path).observe(end_time - start_time)
+        endpoint = route_template(request)
+        request_count.labels(method, endpoint, 429).inc()
+        request_latency.labels(method, endpoint).observe(time.time() - start_time)
         raise HTTPException(status_code=429, detail="Too Many Requests")
 
     response = await call_next(request)
-    end_time = time.time()
-    duration = end_time - start_time
-    
-    endpoint = request.url.path
-    method = request.method
-    status_code = response.status_code
+    duration = time.time() - start_time
 
-    REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(duration)
-    REQUEST_COUNT.labels(method=method, endpoint=endpoint, http_status=status_code).inc()
+    endpoint = route_template(request)
+    status_code = response.status_code
 
-    logger.info(
-        "http_request",
-        http_method=method,
-        http_path=endpoint,
-        http_status_code=status_code,
-        duration=duration,
-    )
+    request_latency.labels(method, endpoint).observe(duration)
+    request_count.labels(method, endpoint, status_code).inc()
+
+    sample_rate = request_log_sampler.sample(status_code, duration)
+    if sample_rate is not None:
+        logger.info(
+            "http_request",
+            http_method=request.method,
+            http_path=request.url.path,
+            http_status_code=status_code,
+            duration=duration,
+            sample_rate=sample_rate,
+        )
     
     return response
 
 # --- Entropy Control Endpoints ---
 class LatencyRequest(BaseModel):
     latency: float
+    distribution: str = "fixed"
+    jitter: float = 0.0
+    tail_alpha: float = 2.0
+    percentile: Optional[float] = None
 
 class ErrorRateRequest(BaseModel):
     error_rate: float
@@ -130,21 +165,50 @@ class ThroughputRequest(BaseModel):
 
 @app.post("/entropy/latency")
 async def set_latency(req: LatencyRequest):
+    if req.distribution not in DISTRIBUTIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid latency distribution: {req.distribution}")
+    if req.percentile is not None and not 0 < req.percentile < 1:
+        raise HTTPException(status_code=400, detail="Percentile must be between 0 and 1")
+    if req.tail_alpha <= 0 or req.jitter < 0:
+        raise HTTPException(status_code=400, detail="Jitter must be >= 0 and tail_alpha > 0")
+
     entropy_settings.latency = req.latency
-    return {"message": f"Latency set to {req.latency}s"}
+    entropy_settings.latency_distribution = req.distribution
+    entropy_settings.latency_jitter = req.jitter
+    entropy_settings.latency_tail_alpha = req.tail_alpha
+    entropy_settings.latency_percentile = req.percentile
+    if shared_entropy is not None:
+        shared_entropy.publish({
+            "latency": req.latency,
+            "latency_distribution": req.distribution,
+            "latency_jitter": req.jitter,
+            "latency_tail_alpha": req.tail_alpha,
+            "latency_percentile": req.percentile,
+        })
+    if req.distribution == "fixed":
+        return {"message": f"Latency set to {req.latency}s"}
+    return {"message": f"Latency set to {req.latency}s ({req.distribution})"}
 
 @app.post("/entropy/errors")
 async def set_error_rate(req: ErrorRateRequest):
     entropy_settings.error_rate = req.error_rate
+    if shared_entropy is not None:
+        shared_entropy.publish({"error_rate": req.error_rate})
     return {"message": f"Error rate set to {req.error_rate}"}
 
 @app.post("/entropy/throughput")
 async def set_throughput(req: ThroughputRequest):
     entropy_settings.throughput = req.throughput
+    if shared_entropy is not None:
+        shared_entropy.publish({"throughput": req.throughput})
     return {"message": f"Throughput set to {req.throughput}"}
 
 
 # --- Background Traffic Simulator ---
+# In-process traffic shares the event loop with the requests it measures;
+# use tests/load/loadgen.py for load tests
+SIMULATE_TRAFFIC = os.environ.get("SIMULATE_TRAFFIC", "false").lower() == "true"
+
 async def simulate_traffic():
     """A simple async task to simulate user traffic."""
     endpoints = ["/", "/products", "/checkout", "/cart/add"]
@@ -155,7 +219,7 @@ async def simulate_traffic():
         "/cart/add": "POST"
     }
     
-    async with httpx.AsyncClient(base_url="http://localhost:8000") as client:
+    async with create_http_client("traffic-simulator", base_url="http://localhost:8000") as client:
         while True:
             try:
                 endpoint = random.choice(endpoints)
@@ -171,15 +235,36 @@ async def simulate_traffic():
 
 @app.on_event("startup")
 async def startup_event():
+    log_writer.start()
+    async with database.engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+        await conn.run_sync(models.upgrade_schema)
+
     # Seed the database with some products if it's empty
-    db = database.SessionLocal()
-    if db.query(models.Product).count() == 0:
-        db.add(models.Product(name="Laptop", description="A powerful laptop", price=1200.00))
-        db.add(models.Product(name="Keyboard", description="A mechanical keyboard", price=150.00))
-        db.add(models.Product(name="Mouse", description="A wireless mouse", price=50.00))
-        db.commit()
-    db.close()
-    asyncio.create_task(simulate_traffic())
+    async with database.SessionLocal() as db:
+        if await db.scalar(select(func.count()).select_from(models.Product)) == 0:
+            db.add(models.Product(name="Laptop", description="A powerful laptop", price=1200.00))
+            db.add(models.Product(name="Keyboard", description="A mechanical keyboard", price=150.00))
+            db.add(models.Product(name="Mouse", description="A wireless mouse", price=50.00))
+            await db.commit()
+    product_cache.start_invalidation_listener()
+    if entropy_subscriber is not None:
+        entropy_subscriber.start()
+    if SIMULATE_TRAFFIC:
+        asyncio.create_task(simulate_traffic())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await product_cache.stop_invalidation_listener()
+    if entropy_subscriber is not None:
+        await entropy_subscriber.stop()
+    # A client built on an explicit pool leaves the pool open unless told otherwise
+    await r.aclose(close_connection_pool=True)
+    await payment_api_client.aclose()
+    await database.engine.dispose()
+    mark_worker_stopped()
+    log_writer.close()
 
 
 # --- Business Endpoints ---
@@ -192,15 +277,23 @@ def read_root():
     return {"Hello": "E-commerce API"}
 
 @app.post("/checkout")
-@retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
-async def checkout():
+async def checkout(request: Request):
+    deadline = Deadline.from_request(request, CHECKOUT_DEADLINE_SECONDS)
     with tracer.start_as_current_span("checkout") as span:
         try:
+            async def send_authorization(deadline: Deadline):
+                return await payment_api_client.post(
+                    "/authorize",
+                    json={"card_number": "1234", "expiry_date": "12/25", "cvv": "123", "amount": 100.0},
+                    headers=deadline.headers(),
+                    timeout=deadline.remaining(),
+                )
+
             # Call payment API with circuit breaker
             @payment_breaker
             async def call_payment_api():
                 with tracer.start_as_current_span("call_payment_api") as child_span:
-                    response = await payment_api_client.post("/authorize", json={"card_number": "1234", "expiry_date": "12/25", "cvv": "123", "amount": 100.0})
+                    response = await payment_caller.call(send_authorization, deadline)
                     child_span.set_attribute("http.status_code", response.status_code)
                     return response
 
@@ -213,7 +306,7 @@ async def checkout():
             span.record_exception(e)
             span.set_status(trace.StatusCode.ERROR, "Payment service is unavailable")
             raise HTTPException(status_code=503, detail="Payment service is unavailable")
-        except RetryError as e:
+        except (DeadlineExceeded, httpx.TimeoutException) as e:
             logger.error("payment_service_timeout", error=str(e))
             span.record_exception(e)
             span.set_status(trace.StatusCode.ERROR, "Payment service timed out")
@@ -224,17 +317,82 @@ async def checkout():
             span.set_status(trace.StatusCode.ERROR, "Checkout failed")
             raise HTTPException(status_code=500, detail="Internal Server Error")
 
-@app.get("/products")
-async def get_products(db: Session = Depends(database.get_db)):
-    cached_products = r.get("products")
-    if cached_products:
-        return json.loads(cached_products)
-    
-    products = db.query(models.Product).all()
+# --- Product Catalog ---
+PRODUCT_PAGE_SIZE = 100
+MAX_PRODUCT_PAGE_SIZE = 1000
+PRODUCT_CATALOG_CACHE_KEY = "product_catalog:first_page"
+
+async def fetch_product_page(db: AsyncSession, limit: int, cursor: Optional[int] = None, where=()):
+    """
+    Fetches one page of products ordered by ID using keyset pagination.
+
+    `cursor` is the last ID of the previous page, so each page is an index range
+    scan regardless of how deep into the catalog it is.
+    """
+    stmt = select(models.Product).where(*where).order_by(models.Product.id).limit(limit + 1)
+    if cursor is not None:
+        stmt = stmt.where(models.Product.id > cursor)
+    products = (await db.scalars(stmt)).all()
+
+    next_cursor = products[limit - 1].id if len(products) > limit else None
     # Convert products to a list of dicts to make it JSON serializable
-    products_dict = [{"id": p.id, "name": p.name, "description": p.description, "price": p.price} for p in products]
-    r.set("products", json.dumps(products_dict))
-    return products_dict
+    items = [{"id": p.id, "name": p.name, "description": p.description, "price": p.price} for p in products[:limit]]
+    return {"items": items, "next_cursor": next_cursor}
+
+def paginated(response: Response, page: dict):
+    if page["next_cursor"] is not None:
+        response.headers["X-Next-Cursor"] = str(page["next_cursor"])
+    return page["items"]
+
+def escape_like(text: str) -> str:
+    """Escapes LIKE wildcards so user input only ever matches literally."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+async def load_products():
+    """Loads the first catalog page from Postgres on a cache miss."""
+    # Uses its own session because stale entries are refreshed after the request ends
+    async with database.SessionLocal() as db:
+        return await fetch_product_page(db, PRODUCT_PAGE_SIZE)
+
+@app.get("/products")
+async def get_products(
+    response: Response,
+    limit: int = Query(PRODUCT_PAGE_SIZE, ge=1, le=MAX_PRODUCT_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    name: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_db),
+):
+    """Lists products a page at a time; the next page's cursor is in the X-Next-Cursor header."""
+    where = []
+    if min_price is not None:
+        where.append(models.Product.price >= min_price)
+    if max_price is not None:
+        where.append(models.Product.price <= max_price)
+    if name:
+        where.append(models.Product.name.ilike(f"%{escape_like(name)}%", escape="\\"))
+
+    # Only the unfiltered first page is hot enough to cache
+    if cursor is None and not where and limit == PRODUCT_PAGE_SIZE:
+        page = await product_cache.get_or_load(PRODUCT_CATALOG_CACHE_KEY, load_products)
+    else:
+        page = await fetch_product_page(db, limit, cursor, where)
+    return paginated(response, page)
+
+@app.get("/products/search")
+async def search_products(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(PRODUCT_PAGE_SIZE, ge=1, le=MAX_PRODUCT_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    db: AsyncSession = Depends(database.get_db),
+):
+    """Full-text search over product names and descriptions, served by the ix_products_search GIN index."""
+    query = func.websearch_to_tsquery(literal_column("'english'"), q)
+    matches = models.search_document(models.Product.name, models.Product.description).op("@@")(query)
+    page = await fetch_product_page(db, limit, cursor, [matches])
+    return paginated(response, page)
 
 class ProductCreate(BaseModel):
     name: str
@@ -242,12 +400,12 @@ class ProductCreate(BaseModel):
     price: float
 
 @app.post("/products")
-async def create_product(product: ProductCreate, db: Session = Depends(database.get_db)):
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(database.get_db)):
     db_product = models.Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
-    r.delete("products")
+    await db.commit()
+    await db.refresh(db_product)
+    await product_cache.invalidate(PRODUCT_CATALOG_CACHE_KEY)
     return db_product
 
 @app.post("/cart/add")
@@ -255,18 +413,65 @@ async def add_to_cart():
     # time.sleep(0.01) # Simulate work - now handled by middleware
     return {"message": "Item added to cart"}
 
+class OrderItemCreate(BaseModel):
+    product_id: int
+    quantity: int = Field(1, gt=0)
+
+class OrderCreate(BaseModel):
+    items: List[OrderItemCreate]
+
+class BulkOrderCreate(BaseModel):
+    orders: List[OrderCreate]
+
+MAX_BULK_ORDERS = 1000
+
+async def insert_orders(db: AsyncSession, orders: List[OrderCreate]) -> List[int]:
+    """Inserts orders and their items with one statement each, returning the new order IDs."""
+    if len(orders) == 1:
+        order_ids = [await db.scalar(insert(models.Order).returning(models.Order.id))]
+    else:
+        # Orders have no columns besides their ID, so draw IDs straight from the sequence
+        next_id = func.nextval(func.pg_get_serial_sequence(models.Order.__tablename__, "id"))
+        rows = select(next_id).select_from(func.generate_series(1, len(orders)))
+        stmt = insert(models.Order).from_select([models.Order.id], rows).returning(models.Order.id)
+        order_ids = list(await db.scalars(stmt))
+
+    items = [
+        {"order_id": order_id, "product_id": item.product_id, "quantity": item.quantity}
+        for order_id, order in zip(order_ids, orders)
+        for item in order.items
+    ]
+    if items:
+        # Executed as batched multi-row INSERTs
+        await db.execute(insert(models.OrderItem), items)
+    return order_ids
+
 @app.post("/orders")
-async def create_order(db: Session = Depends(database.get_db)):
+async def create_order(db: AsyncSession = Depends(database.get_db)):
     # In a real application, you would get the cart from the current user's session
     # For simplicity, we'll create an order with a single, hardcoded item
-    db_order = models.Order()
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
-
-    db_item = models.OrderItem(order_id=db_order.id, product_id=1, quantity=1)
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
-
-    return {"id": db_order.id}
+    order = OrderCreate(items=[OrderItemCreate(product_id=1, quantity=1)])
+    order_ids = await insert_orders(db, [order])
+    await db.commit()
+    return {"id": order_ids[0]}
+
+@app.post("/orders/bulk")
+async def create_orders_bulk(payload: BulkOrderCreate, db: AsyncSession = Depends(database.get_db)):
+    if not payload.orders:
+        raise HTTPException(status_code=400, detail="At least one order is required")
+    if len(payload.orders) > MAX_BULK_ORDERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ORDERS} orders per request")
+    try:
+        order_ids = await insert_orders(db, payload.orders)
+        await db.commit()
+    except IntegrityError:
+        # Only the product foreign key can fail; look up which IDs were bad
+        # here rather than checking every request up front
+        await db.rollback()
+        requested = {item.product_id for order in payload.orders for item in order.items}
+        known = set(await db.scalars(select(models.Product.id).where(models.Product.id.in_(requested))))
+        unknown = sorted(requested - known)
+        if not unknown:
+            raise
+        raise HTTPException(status_code=422, detail=f"Unknown product IDs: {unknown}")
+    return {"ids": order_ids}
@@ -1,14 +1,43 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import DDL, Column, Integer, String, Float, ForeignKey, Index, event, func, literal_column
+from sqlalchemy.dialects import postgresql  # registers the full-text search functions
 from sqlalchemy.orm import relationship
 from database import Base
 
+def search_document(name, description):
+    """
+    The full-text search document for a product.
+
+    Constants are rendered as literals so the expression in queries matches the
+    GIN index on products; a bound parameter would stop the planner using it.
+    """
+    text = func.coalesce(name, literal_column("''")).op("||")(literal_column("' '")).op("||")(
+        func.coalesce(description, literal_column("''"))
+    )
+    return func.to_tsvector(literal_column("'english'"), text)
+
 class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    description = Column(String, index=True)
-    price = Column(Float)
+    description = Column(String)
+    price = Column(Float, index=True)
+
+    __table_args__ = (
+        Index("ix_products_search", search_document(name, description), postgresql_using="gin"),
+        # Serves the substring ILIKE behind GET /products?name=
+        Index("ix_products_name_trgm", name, postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+    )
+
+# gin_trgm_ops comes from pg_trgm, which must exist before the index is created
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+def upgrade_schema(connection):
+    """Brings tables created by earlier versions up to date; create_all only adds missing tables."""
+    # The B-tree on free-text descriptions never served a query
+    connection.exec_driver_sql("DROP INDEX IF EXISTS ix_products_description")
+    for index in Product.__table__.indexes:
+        index.create(connection, checkfirst=True)
 
 class Order(Base):
     __tablename__ = "orders"
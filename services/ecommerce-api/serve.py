@@ -0,0 +1,50 @@
+"""
+Runs the service under uvicorn with WEB_CONCURRENCY worker processes.
+
+    WEB_CONCURRENCY=4 python serve.py
+
+With more than one worker, metrics are written to PROMETHEUS_MULTIPROC_DIR
+and aggregated across workers on /metrics, and entropy set through the
+service's POST endpoints is shared through ENTROPY_STATE_FILE. Entropy
+pushed by the engine (ENTROPY_PUSH_URL) reaches every worker on its own.
+
+Each service keeps its own copy of this file because every service image is
+built from the service's own directory; keep the copies in step.
+"""
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+
+def prepare_workers() -> None:
+    """Points the workers at fresh shared metric and entropy files; they inherit the environment."""
+    state_dir = os.path.join(tempfile.gettempdir(), "workers")
+    metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(state_dir, "metrics"))
+    entropy_file = os.environ.setdefault("ENTROPY_STATE_FILE", os.path.join(state_dir, "entropy.json"))
+    # Leftovers from before a restart would be summed into the new metrics
+    # and re-apply stale entropy
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    if os.path.exists(entropy_file):
+        os.remove(entropy_file)
+
+
+def main() -> None:
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        prepare_workers()
+    uvicorn.run(
+        "main:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8000")),
+        workers=workers,
+        # uvloop and httptools, from uvicorn[standard]
+        loop="uvloop",
+        http="httptools",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# Kept identical in auth-api, payment-api and ecommerce-api/core: each service
+# image is built from its own directory, so the module can't be shared.
+import asyncio
+import fcntl
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+import redis.asyncio as aioredis
+import structlog
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = structlog.get_logger()
+
+# Must match the channel the entropy engine publishes on
+ENTROPY_CHANNEL = "entropy:config"
+
+ENTROPY_CONFIG_VERSION = Gauge(
+    "entropy_config_version",
+    "Version of the entropy configuration this replica has applied",
+    # With several workers, report the one furthest behind
+    multiprocess_mode="livemin"
+)
+ENTROPY_CONFIG_UPDATES = Counter(
+    "entropy_config_updates_total",
+    "Pushed entropy configurations by outcome",
+    ["result"]
+)
+ENTROPY_CONFIG_PROPAGATION = Histogram(
+    "entropy_config_propagation_seconds",
+    "Time from the engine publishing an entropy configuration to this replica applying it",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+
+class EntropySubscriber:
+    """
+    Applies entropy configurations pushed by the entropy engine.
+
+    Every replica subscribes to ENTROPY_CHANNEL and hands each new state for
+    its service to `apply` in a single synchronous call, so requests never see
+    half of an update. Messages with a version at or below the applied one are
+    ignored. On every (re)subscribe the latest snapshot is read so a replica
+    that starts late, or missed messages while disconnected, catches up.
+    """
+
+    def __init__(self, client: aioredis.Redis, service_id: str, apply: Callable[[Dict[str, Any]], None]):
+        self.client = client
+        self.service_id = service_id
+        self.apply = apply
+        self.version = 0
+        self._listener: Optional[asyncio.Task] = None
+
+    def handle(self, message: str) -> bool:
+        """Applies a published configuration if it is newer; returns whether it was applied."""
+        payload = json.loads(message)
+        if payload["service_id"] != self.service_id:
+            return False
+        if payload["version"] <= self.version:
+            ENTROPY_CONFIG_UPDATES.labels(result="stale").inc()
+            return False
+
+        self.apply(payload["state"])
+        self.version = payload["version"]
+        ENTROPY_CONFIG_VERSION.set(self.version)
+        ENTROPY_CONFIG_UPDATES.labels(result="applied").inc()
+        ENTROPY_CONFIG_PROPAGATION.observe(max(time.time() - payload["published_at"], 0.0))
+        return True
+
+    def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self.client.aclose()
+
+    def _handle_safely(self, message: str) -> None:
+        """Handles a message, counting and logging a bad one instead of ending the subscription."""
+        try:
+            self.handle(message)
+        except Exception as e:
+            ENTROPY_CONFIG_UPDATES.labels(result="invalid").inc()
+            logger.warning("entropy_config_invalid", error=repr(e))
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(ENTROPY_CHANNEL)
+                snapshot = await self.client.get(f"{ENTROPY_CHANNEL}:{self.service_id}")
+                if snapshot is not None:
+                    self._handle_safely(snapshot)
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        self._handle_safely(message["data"])
+            except aioredis.RedisError as e:
+                logger.warning("entropy_subscription_failed", error=str(e))
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+
+class SharedEntropyFile:
+    """
+    Shares entropy changes made through the service's POST endpoints between its worker processes.
+
+    A POST lands on a single worker, which merges the change into the JSON
+    file at `path`. Every worker calls `sync()` on each request; it stats the
+    file at most once per `check_interval` seconds and applies the full state
+    whenever the file has been replaced.
+    """
+
+    def __init__(self, path: str, apply: Callable[[Dict[str, Any]], None], check_interval: float = 0.1):
+        self.path = path
+        self.apply = apply
+        self.check_interval = check_interval
+        self._next_check = 0.0
+        self._file_id = None
+
+    def sync(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        # Every publish replaces the file, so a new inode means new contents
+        # even where mtimes are too coarse to tell two writes apart
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if file_id == self._file_id:
+            return
+        with open(self.path) as f:
+            state = json.load(f)
+        self._file_id = file_id
+        self.apply(state)
+
+    def publish(self, changes: Dict[str, Any]) -> None:
+        """Merges `changes` into the shared state; the other workers apply it within `check_interval`."""
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.path) as f:
+                    state = json.load(f)
+            except FileNotFoundError:
+                state = {}
+            state.update(changes)
+            temporary = f"{self.path}.{os.getpid()}"
+            with open(temporary, "w") as f:
+                json.dump(state, f)
+            os.replace(temporary, self.path)
+
+
+def create_shared_entropy_file(apply: Callable[[Dict[str, Any]], None]) -> Optional[SharedEntropyFile]:
+    """Builds the cross-worker entropy file when ENTROPY_STATE_FILE is set, as serve.py does for several workers."""
+    path = os.environ.get("ENTROPY_STATE_FILE")
+    if not path:
+        return None
+    return SharedEntropyFile(path, apply)
+
+
+def create_entropy_subscriber(service_id: str, apply: Callable[[Dict[str, Any]], None]) -> Optional[EntropySubscriber]:
+    """Builds a subscriber when ENTROPY_PUSH_URL is set; otherwise entropy only arrives via POST."""
+    url = os.environ.get("ENTROPY_PUSH_URL")
+    if not url:
+        return None
+    return EntropySubscriber(aioredis.Redis.from_url(url), service_id, apply)
@@ -3,12 +3,17 @@ import random
 import time
 import random
 import asyncio
+import os
 import uuid
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from prometheus_client import make_asgi_app, Counter, Histogram, Summary, Gauge
+from prometheus_client import Counter, Histogram, Summary, Gauge
 from fastapi import FastAPI, Request, Response
 
+from transactions import TransactionStore
+from entropy_channel import create_entropy_subscriber, create_shared_entropy_file
+from metrics import BoundMetric, make_metrics_app, mark_worker_stopped, request_method, route_template
+
 app = FastAPI()
 
 # In-memory store for entropy state
@@ -22,6 +27,9 @@ class ErrorRatePayload(BaseModel):
 
 @app.middleware("http")
 async def entropy_middleware(request, call_next):
+    if shared_entropy is not None:
+        shared_entropy.sync()
+
     # Introduce latency
     if entropy_state["latency"] > 0:
         await asyncio.sleep(entropy_state["latency"])
@@ -33,14 +41,37 @@ async def entropy_middleware(request, call_next):
     response = await call_next(request)
     return response
 
+def apply_entropy(state):
+    """Replaces the entropy state in one step with a configuration pushed by the engine."""
+    entropy_state.update({key: state[key] for key in ("latency", "error_rate") if key in state})
+
+entropy_subscriber = create_entropy_subscriber("payment-api", apply_entropy)
+# Shares POSTed entropy between worker processes; None with a single worker
+shared_entropy = create_shared_entropy_file(apply_entropy)
+
+@app.on_event("startup")
+async def startup_event():
+    if entropy_subscriber is not None:
+        entropy_subscriber.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if entropy_subscriber is not None:
+        await entropy_subscriber.stop()
+    mark_worker_stopped()
+
 @app.post("/entropy/latency")
 async def set_latency(payload: LatencyPayload):
     entropy_state["latency"] = payload.latency
+    if shared_entropy is not None:
+        shared_entropy.publish({"latency": payload.latency})
     return {"message": f"Latency set to {payload.latency}"}
 
 @app.post("/entropy/errors")
 async def set_error_rate(payload: ErrorRatePayload):
     entropy_state["error_rate"] = payload.error_rate
+    if shared_entropy is not None:
+        shared_entropy.publish({"error_rate": payload.error_rate})
     return {"message": f"Error rate set to {payload.error_rate}"}
 
 # Define Prometheus metrics
@@ -79,14 +110,24 @@ PAYMENT_FAILURE = Counter(
 
 TRANSACTION_CONSISTENCY = Gauge(
     "payment_transaction_consistency_ratio",
-    "Ratio of consistent to inconsistent transactions"
+    "Ratio of consistent to inconsistent transactions",
+    # Each worker tracks its own transactions; report the least consistent
+    multiprocess_mode="livemin"
 )
 
-# In-memory store for transaction states for simplicity
-transaction_states = {}
+# Labelled by route template, with pre-bound children
+request_count = BoundMetric(REQUEST_COUNT)
+request_latency = BoundMetric(REQUEST_LATENCY)
+slo_latency = BoundMetric(SLO_LATENCY_SECONDS)
+
+# Bounded in-memory store for transaction states
+transaction_store = TransactionStore(
+    max_size=int(os.environ.get("TRANSACTION_STORE_MAX_SIZE", "10000")),
+    ttl_seconds=float(os.environ.get("TRANSACTION_STORE_TTL_SECONDS", "3600")),
+)
 
 # Mount the Prometheus metrics app
-metrics_app = make_asgi_app()
+metrics_app = make_metrics_app()
 app.mount("/metrics", metrics_app)
 
 # --- Configuration for External Provider Simulation ---
@@ -123,8 +164,9 @@ def read_root():
 async def authorize_payment(request: Request, payment_request: PaymentRequest):
     """Simulates authorizing a payment through a third-party provider."""
     start_time = time.time()
+    method, endpoint = request_method(request), route_template(request)
     transaction_id = str(uuid.uuid4())
-    transaction_states[transaction_id] = "processing"
+    transaction_store.begin(transaction_id)
     
     # Determine card type for simulation
     card_type = "default"
@@ -147,42 +189,43 @@ async def authorize_payment(request: Request, payment_request: PaymentRequest):
         # Simulate success/failure based on card type
         failure_rate = config["provider_failure_rate"].get(card_type, config["provider_failure_rate"]["default"])
         if random.random() < failure_rate:
-            transaction_states[transaction_id] = "failed"
+            transaction_store.transition(transaction_id, "failed")
             PAYMENT_FAILURE.inc()
-            REQUEST_COUNT.labels(method=request.method, endpoint=request.url.path, http_status=500).inc()
+            request_count.labels(method, endpoint, 500).inc()
             raise HTTPException(status_code=500, detail=f"Payment authorization failed for {card_type}")
 
-        transaction_states[transaction_id] = "success"
+        transaction_store.transition(transaction_id, "success")
         PAYMENT_SUCCESS.inc()
-        REQUEST_COUNT.labels(method=request.method, endpoint=request.url.path, http_status=200).inc()
+        request_count.labels(method, endpoint, 200).inc()
         end_time = time.time()
         latency = end_time - start_time
-        REQUEST_LATENCY.labels(method=request.method, endpoint=request.url.path).observe(latency)
-        SLO_LATENCY_SECONDS.labels(method=request.method, endpoint=request.url.path).observe(latency)
+        request_latency.labels(method, endpoint).observe(latency)
+        slo_latency.labels(method, endpoint).observe(latency)
         
         # Update consistency metric
         update_consistency_metric()
         
         return {"message": "Payment authorized", "transaction_id": transaction_id}
     except HTTPException as e:
-        transaction_states[transaction_id] = "failed"
+        transaction_store.transition(transaction_id, "failed")
         end_time = time.time()
         latency = end_time - start_time
-        REQUEST_LATENCY.labels(method=request.method, endpoint=request.url.path).observe(latency)
-        SLO_LATENCY_SECONDS.labels(method=request.method, endpoint=request.url.path).observe(latency)
+        request_latency.labels(method, endpoint).observe(latency)
+        slo_latency.labels(method, endpoint).observe(latency)
         
         # Update consistency metric
         update_consistency_metric()
         
         raise e
 
+@app.get("/transactions/{transaction_id}")
+def get_transaction(transaction_id: str):
+    """Looks up the state of a recent transaction."""
+    transaction = transaction_store.get(transaction_id)
+    if transaction is None:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    return transaction
+
 def update_consistency_metric():
     """Updates the transaction consistency metric."""
-    consistent_count = sum(1 for state in transaction_states.values() if state in ["success", "failed"])
-    inconsistent_count = len(transaction_states) - consistent_count
-    
-    if len(transaction_states) > 0:
-        consistency_ratio = consistent_count / len(transaction_states)
-        TRANSACTION_CONSISTENCY.set(consistency_ratio)
-    else:
-        TRANSACTION_CONSISTENCY.set(1.0)
+    TRANSACTION_CONSISTENCY.set(transaction_store.consistency_ratio())
@@ -0,0 +1,98 @@
+import os
+from typing import Dict, Tuple
+
+from prometheus_client import CollectorRegistry, Counter, make_asgi_app, multiprocess
+from starlette.requests import Request
+from starlette.routing import Match
+
+# Label value for requests that match no route, e.g. scanners probing for paths
+UNMATCHED_ROUTE = "unmatched"
+# Label value that replaces the capped label once a metric has too many series
+OVERFLOW_LABEL = "other"
+
+KNOWN_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+MAX_SERIES = int(os.environ.get("METRICS_MAX_SERIES_PER_METRIC", "500"))
+# Set by serve.py when running several workers; each one writes its samples here
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+LABEL_OVERFLOW = Counter(
+    "metrics_label_overflow_total",
+    "Observations recorded under the overflow label because a metric hit its series cap",
+    ["metric"]
+)
+
+
+def make_metrics_app():
+    """
+    Returns the ASGI app serving /metrics.
+
+    With several workers it aggregates every worker's samples from
+    MULTIPROC_DIR, so a scrape sees the container's totals rather than
+    whichever worker happened to answer.
+    """
+    if not MULTIPROC_DIR:
+        return make_asgi_app()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return make_asgi_app(registry)
+
+
+def mark_worker_stopped() -> None:
+    """Drops this worker's live gauges from the aggregate when it shuts down."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def route_template(request: Request) -> str:
+    """
+    Returns the path template of the route serving a request, e.g. "/transactions/{transaction_id}".
+
+    After routing this is read from the request scope; before routing (or for
+    mounted apps) the app's routes are matched directly.
+    """
+    route = request.scope.get("route")
+    if route is None:
+        for candidate in request.scope["app"].router.routes:
+            match, _ = candidate.matches(request.scope)
+            # A partial match is the right path with the wrong method
+            if match != Match.NONE:
+                route = candidate
+                break
+    return route.path if route is not None else UNMATCHED_ROUTE
+
+
+def request_method(request: Request) -> str:
+    """Returns the request method, folding unknown ones into a single label value."""
+    return request.method if request.method in KNOWN_METHODS else "OTHER"
+
+
+class BoundMetric:
+    """
+    Caches a metric's label children so recording an observation is a dict lookup.
+
+    At most `max_series` distinct label combinations are bound. Beyond that,
+    `overflow_label` is replaced with OVERFLOW_LABEL so a flood of new values
+    can't grow the metric, and the scrape, without bound.
+    """
+
+    def __init__(self, metric, overflow_label: str = "endpoint", max_series: int = MAX_SERIES):
+        self.metric = metric
+        self.max_series = max_series
+        self._overflow_index = list(metric._labelnames).index(overflow_label)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        name = f"{metric._name}_total" if metric._type == "counter" else metric._name
+        self._overflow = LABEL_OVERFLOW.labels(metric=name)
+
+    def labels(self, *values) -> object:
+        child = self._children.get(values)
+        if child is not None:
+            return child
+        if len(self._children) >= self.max_series:
+            self._overflow.inc()
+            values = values[:self._overflow_index] + (OVERFLOW_LABEL,) + values[self._overflow_index + 1:]
+            child = self._children.get(values)
+            if child is not None:
+                return child
+        child = self.metric.labels(*values)
+        self._children[values] = child
+        return child
@@ -0,0 +1,34 @@
+"""
+Runs the service under uvicorn.
+
+    python serve.py
+
+Only a single worker process is supported. Transactions are tracked in the
+memory of the worker that authorized them, so with more than one worker
+GET /transactions/{id} would miss whenever it landed on another worker.
+WEB_CONCURRENCY above 1 is refused until the transaction store is shared.
+
+The other services' copies of this file prepare shared metric and entropy
+files for their workers; this one doesn't need to.
+"""
+import os
+
+import uvicorn
+
+
+def main() -> None:
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        raise SystemExit("payment-api tracks transactions per process and can't run more than one worker")
+    uvicorn.run(
+        "main:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8000")),
+        # uvloop and httptools, from uvicorn[standard]
+        loop="uvloop",
+        http="httptools",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Optional, Tuple
+
+TERMINAL_STATES = ("success", "failed")
+
+
+class TransactionStore:
+    """
+    Tracks transaction states with O(1) updates and bounded memory.
+
+    In-flight and terminal transactions live in separate insertion-ordered
+    rings, each trimmed to `max_size` entries and to entries younger than
+    `ttl_seconds`, so a long run never grows the store without bound. An
+    in-flight transaction that old was abandoned, e.g. by a cancelled request,
+    and will never reach a terminal state. Per-state counters are maintained on
+    every transition, which keeps the consistency ratio cheap to compute.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 3600.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._in_flight: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._terminal: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._counts: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self._in_flight) + len(self._terminal)
+
+    def begin(self, transaction_id: str) -> None:
+        """Registers a new transaction in the "processing" state."""
+        self.transition(transaction_id, "processing")
+
+    def transition(self, transaction_id: str, state: str) -> None:
+        """Moves a transaction to `state`, updating the counters incrementally."""
+        previous = self._in_flight.pop(transaction_id, None) or self._terminal.pop(transaction_id, None)
+        if previous is not None:
+            self._counts[previous[0]] -= 1
+
+        now = self._clock()
+        if state in TERMINAL_STATES:
+            self._terminal[transaction_id] = (state, now)
+        else:
+            self._in_flight[transaction_id] = (state, now)
+        self._counts[state] += 1
+        self._evict(now)
+
+    def get(self, transaction_id: str) -> Optional[Dict[str, str]]:
+        """Returns the transaction's current state, or None if unknown or evicted."""
+        entry = self._in_flight.get(transaction_id) or self._terminal.get(transaction_id)
+        if entry is None:
+            return None
+        return {"transaction_id": transaction_id, "state": entry[0]}
+
+    def consistency_ratio(self) -> float:
+        """Ratio of transactions in a terminal state to all tracked transactions."""
+        total = len(self)
+        if total == 0:
+            return 1.0
+        consistent = sum(self._counts[state] for state in TERMINAL_STATES)
+        return consistent / total
+
+    def _evict(self, now: float) -> None:
+        """Drops the oldest transactions beyond the size cap or TTL."""
+        cutoff = now - self.ttl_seconds
+        for entries in (self._in_flight, self._terminal):
+            while entries:
+                transaction_id, (state, updated_at) = next(iter(entries.items()))
+                if len(entries) <= self.max_size and updated_at >= cutoff:
+                    break
+                entries.popitem(last=False)
+                self._counts[state] -= 1
@@ -0,0 +1,274 @@
+"""
+Drives one service's FastAPI app in-process and times its hot paths.
+
+Run from the service's directory, as test_asgi_hot_paths.py does:
+
+    python asgi_hot_paths.py <service> <results.json>
+
+Requests go through httpx's ASGITransport, so they exercise the app's
+middleware, validation, serialization, auth and metrics but no sockets.
+Redis, Postgres, Docker and downstream services are replaced with fakes,
+and entropy is switched off, so the numbers are the service's own overhead.
+Each is reported as a multiple of the time an empty request takes.
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import types
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+
+ROUNDS = int(os.environ.get("BENCHMARK_ROUNDS", "5"))
+REQUESTS_PER_ROUND = int(os.environ.get("BENCHMARK_REQUESTS_PER_ROUND", "200"))
+
+# (name, method, path, request kwargs)
+HotPath = Tuple[str, str, str, Dict]
+
+
+class FakeRedis:
+    """The subset of redis.asyncio.Redis the services use, kept in a dict."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def publish(self, channel, message):
+        return 0
+
+    async def aclose(self):
+        pass
+
+
+class FakeResult(list):
+    def all(self):
+        return list(self)
+
+
+class FakeSession:
+    """
+    An AsyncSession stand-in that answers queries from a fixed list of rows.
+
+    Results are shaped like the statement: INSERT ... RETURNING gives one new
+    ID per inserted row, a SELECT of a column gives that column of every row,
+    a SELECT of the model gives the rows and anything else, such as a count,
+    gives 1.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.next_id = len(rows) + 1
+
+    async def scalars(self, stmt):
+        from sqlalchemy.sql.dml import Insert
+
+        if isinstance(stmt, Insert):
+            ids = range(self.next_id, self.next_id + self._inserted_rows(stmt))
+            self.next_id = ids.stop
+            return FakeResult(ids)
+        column = stmt.column_descriptions[0]
+        if column["expr"] is column["entity"]:
+            return FakeResult(self.rows)
+        if column["entity"] is not None:
+            return FakeResult(getattr(row, column["name"]) for row in self.rows)
+        return FakeResult([1])
+
+    async def scalar(self, stmt):
+        return (await self.scalars(stmt))[0]
+
+    @staticmethod
+    def _inserted_rows(stmt) -> int:
+        if stmt.select is None:
+            return 1
+        # Multi-row inserts select from generate_series(1, n)
+        return max(value for value in stmt.compile().params.values() if isinstance(value, int))
+
+    async def execute(self, stmt, params=None):
+        return None
+
+    def add(self, obj):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, obj):
+        pass
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+def setup_ecommerce_api() -> Tuple[object, List[HotPath]]:
+    import main
+    import models
+    from cache import product_cache
+
+    rows = [
+        models.Product(id=i, name=f"Product {i}", description=f"Description of product {i}", price=10.0 + i)
+        for i in range(1, 101)
+    ]
+
+    async def get_db():
+        yield FakeSession(rows)
+
+    main.app.dependency_overrides[main.database.get_db] = get_db
+    main.database.SessionLocal = lambda: FakeSession(rows)
+    product_cache.client = FakeRedis()
+    main.payment_api_client = httpx.AsyncClient(
+        base_url="http://payment-api:8000",
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"message": "Payment authorized"})),
+    )
+    main.entropy_settings.latency = 0.0
+    return main.app, [
+        ("health", "GET", "/health", {}),
+        ("products_cached_page", "GET", "/products", {}),
+        ("products_uncached_page", "GET", "/products", {"params": {"limit": 50}}),
+        ("cart_add", "POST", "/cart/add", {}),
+        ("checkout", "POST", "/checkout", {}),
+        ("orders_bulk", "POST", "/orders/bulk", {"json": {"orders": [{"items": [{"product_id": 1}]}] * 10}}),
+        ("metrics", "GET", "/metrics/", {}),
+    ]
+
+
+def setup_auth_api() -> Tuple[object, List[HotPath]]:
+    import main
+    import security
+
+    token = security.create_access_token(data={"sub": "johndoe"})
+    return main.app, [
+        ("health", "GET", "/health", {}),
+        ("users_me_cached_token", "GET", "/users/me", {"headers": {"Cookie": f"access_token={token}"}}),
+        ("users_me_rejected", "GET", "/users/me", {"headers": {"Cookie": "access_token=not-a-token"}}),
+        ("metrics", "GET", "/metrics", {}),
+    ]
+
+
+def setup_payment_api() -> Tuple[object, List[HotPath]]:
+    import main
+
+    # The provider round trip is simulated with a sleep; take it out so only
+    # the service's own work is timed
+    main.config["provider_latency_seconds"] = {key: 0.0 for key in main.config["provider_latency_seconds"]}
+    main.config["provider_failure_rate"] = {key: 0.0 for key in main.config["provider_failure_rate"]}
+    main.random = types.SimpleNamespace(random=random.random, uniform=lambda a, b: 0.0)
+    transaction_id = "benchmark"
+    main.transaction_store.begin(transaction_id)
+    payment = {"card_number": "4111", "expiry_date": "12/25", "cvv": "123", "amount": 100.0}
+    return main.app, [
+        ("health", "GET", "/health", {}),
+        ("authorize", "POST", "/authorize", {"json": payment}),
+        ("transaction_lookup", "GET", f"/transactions/{transaction_id}", {}),
+        ("metrics", "GET", "/metrics/", {}),
+    ]
+
+
+def setup_entropy_engine() -> Tuple[object, List[HotPath]]:
+    import main
+    from core.docker_utils import DockerController
+
+    class FakeContainer:
+        name = "ecommerce-api"
+
+        def update(self, **kwargs):
+            pass
+
+    class FakeDockerClient:
+        def __init__(self):
+            self.containers = self
+
+        def get(self, name):
+            return FakeContainer()
+
+    downstream = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+    main.app.dependency_overrides[main.get_http_client] = lambda: downstream
+    main.docker_controller = DockerController(client_factory=FakeDockerClient)
+    asyncio.run(main.state_store.set_state("ecommerce-api", {"latency": 0, "error_rate": 0}))
+    return main.app, [
+        ("entropy_status", "GET", "/api/entropy/status/ecommerce-api", {}),
+        ("entropy_set", "POST", "/api/entropy/set", {"json": {"service_id": "ecommerce-api", "state": {"latency": 0}}}),
+        ("list_scenarios", "GET", "/api/scenarios", {}),
+        ("docker_control", "POST", "/api/docker/control",
+         {"json": {"service_id": "ecommerce-api", "action": "set_resources", "params": {"cpu_shares": 512}}}),
+        ("metrics", "GET", "/metrics/", {}),
+    ]
+
+
+SERVICES: Dict[str, Callable[[], Tuple[object, List[HotPath]]]] = {
+    "ecommerce-api": setup_ecommerce_api,
+    "auth-api": setup_auth_api,
+    "payment-api": setup_payment_api,
+    "entropy-engine": setup_entropy_engine,
+}
+
+
+async def reference_app(scope, receive, send):
+    """The cheapest possible ASGI app; timing it measures this machine and the harness."""
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def time_requests(client: httpx.AsyncClient, method: str, path: str, kwargs: Dict) -> float:
+    """Returns the best mean time per request, in seconds, over ROUNDS rounds."""
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(REQUESTS_PER_ROUND):
+            await client.request(method, path, **kwargs)
+        best = min(best, (time.perf_counter() - start) / REQUESTS_PER_ROUND)
+    return best
+
+
+async def measure(app, hot_paths: List[HotPath]) -> Dict[str, float]:
+    """
+    Returns the time per request for each hot path, as a multiple of a request to `reference_app`.
+
+    Absolute timings depend on the machine; relative to a request that does
+    nothing they mostly don't, so baselines recorded on one machine hold on another.
+    """
+    transport = httpx.ASGITransport(app=reference_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        await client.get("/")
+        reference = await time_requests(client, "GET", "/", {})
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        for name, method, path, kwargs in hot_paths:
+            # Warm caches, lazy imports and metric children first
+            response = await client.request(method, path, **kwargs)
+            if response.status_code >= 500:
+                raise RuntimeError(f"{name}: {method} {path} returned {response.status_code}")
+            results[name] = await time_requests(client, method, path, kwargs) / reference
+    return results
+
+
+def main():
+    service, output = sys.argv[1], sys.argv[2]
+    sys.path.insert(0, os.getcwd())
+    app, hot_paths = SERVICES[service]()
+    results = asyncio.run(measure(app, hot_paths))
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
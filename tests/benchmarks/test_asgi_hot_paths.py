@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+RUNNER = os.path.join(os.path.dirname(__file__), "asgi_hot_paths.py")
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+SERVICE_DIRS = {
+    "ecommerce-api": os.path.join(ROOT_DIR, "services", "ecommerce-api"),
+    "auth-api": os.path.join(ROOT_DIR, "services", "auth-api"),
+    "payment-api": os.path.join(ROOT_DIR, "services", "payment-api"),
+    "entropy-engine": os.path.join(ROOT_DIR, "entropy-engine"),
+}
+
+# A hot path fails when it is this much slower than its baseline (1.0 = twice as slow).
+# Costs are relative to an empty request, which cancels out most of the
+# difference between machines but not all of it, so the margin is wide
+REGRESSION_THRESHOLD = float(os.environ.get("BENCHMARK_REGRESSION_THRESHOLD", "1.0"))
+# Set to rewrite baselines.json from this run instead of comparing against it
+UPDATE_BASELINES = os.environ.get("BENCHMARK_UPDATE_BASELINES") == "1"
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH) as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("service", sorted(SERVICE_DIRS))
+def test_hot_path_overhead(service, tmp_path):
+    """
+    Times each of a service's hot paths in-process and compares them with the stored baselines.
+
+    Timings and baselines are multiples of an empty request's time, not seconds.
+    """
+    pytest.importorskip("fastapi")
+    output = tmp_path / "results.json"
+    # Each service runs in its own interpreter: they share module names like
+    # `main` and `models` and register metrics with the same names
+    result = subprocess.run(
+        [sys.executable, RUNNER, service, str(output)],
+        cwd=SERVICE_DIRS[service],
+        env={**os.environ, "USER_REPOSITORY": "memory", "STATE_STORE": "memory"},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        if "ModuleNotFoundError" in result.stderr:
+            pytest.skip(f"{service} dependencies are not installed: {result.stderr.strip().splitlines()[-1]}")
+        pytest.fail(f"{service} benchmark failed:\n{result.stderr}")
+    with open(output) as f:
+        timings = json.load(f)
+
+    baselines = load_baselines()
+    if UPDATE_BASELINES:
+        baselines[service] = {name: round(cost, 2) for name, cost in timings.items()}
+        with open(BASELINES_PATH, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return
+
+    regressions = []
+    for name, cost in timings.items():
+        baseline = baselines.get(service, {}).get(name)
+        if baseline is None:
+            print(f"{service} {name}: {cost:.1f}x (no baseline)")
+            continue
+        change = cost / baseline - 1
+        print(f"{service} {name}: {cost:.1f}x ({change:+.0%} vs {baseline:.1f}x)")
+        if change > REGRESSION_THRESHOLD:
+            regressions.append(f"{name}: {cost:.1f}x vs baseline {baseline:.1f}x ({change:+.0%})")
+    assert not regressions, f"{service} hot paths regressed: " + "; ".join(regressions)
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+AUTH_API_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "services", "auth-api")
+
+# Importing the service must not hash passwords or touch a database
+STARTUP_BUDGET_SECONDS = float(os.environ.get("AUTH_API_STARTUP_BUDGET_SECONDS", "2.0"))
+LOOKUP_BUDGET_SECONDS = float(os.environ.get("AUTH_API_LOOKUP_BUDGET_SECONDS", "0.0001"))
+
+
+@pytest.fixture(scope="module")
+def auth_api_path():
+    pytest.importorskip("fastapi")
+    pytest.importorskip("passlib")
+    sys.path.insert(0, AUTH_API_DIR)
+    yield AUTH_API_DIR
+    sys.path.remove(AUTH_API_DIR)
+
+
+def test_auth_api_import_time(auth_api_path):
+    """Measures how long a fresh worker takes to import the auth-api app."""
+    script = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=auth_api_path,
+        env={**os.environ, "USER_REPOSITORY": "memory"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_seconds = float(result.stdout.strip().splitlines()[-1])
+    print(f"auth-api import: {import_seconds * 1000:.1f}ms")
+    assert import_seconds < STARTUP_BUDGET_SECONDS
+
+
+def test_in_memory_repository_lookup_with_large_population(auth_api_path):
+    """Measures username lookups against a large in-memory user population."""
+    from users import SEED_USERS, InMemoryUserRepository
+
+    template = SEED_USERS[0]
+    population = [{**template, "username": f"user{i}"} for i in range(100_000)]
+
+    start = time.perf_counter()
+    repository = InMemoryUserRepository(seed_users=population)
+    user = asyncio.run(repository.get_user("user99999"))
+    print(f"100k users loaded in {(time.perf_counter() - start) * 1000:.1f}ms")
+    assert user.username == "user99999"
+
+    async def lookups(n):
+        start = time.perf_counter()
+        for i in range(n):
+            await repository.get_user(f"user{i}")
+        return (time.perf_counter() - start) / n
+
+    per_lookup = asyncio.run(lookups(10_000))
+    print(f"lookup: {per_lookup * 1e6:.2f}us")
+    assert per_lookup < LOOKUP_BUDGET_SECONDS
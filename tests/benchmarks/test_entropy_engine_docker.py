@@ -0,0 +1,136 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+ENTROPY_ENGINE_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "entropy-engine")
+
+# How long the fake daemon takes to answer each call
+DAEMON_LATENCY_SECONDS = 0.2
+
+
+class FakeNotFound(Exception):
+    pass
+
+
+class FakeContainer:
+    def __init__(self, daemon, name):
+        self.daemon = daemon
+        self.name = name
+
+    def update(self, mem_limit=None, cpu_shares=None):
+        self.daemon.call("update", self.name)
+
+    def stop(self):
+        self.daemon.call("stop", self.name)
+
+    def start(self):
+        self.daemon.call("start", self.name)
+
+
+class FakeNetwork:
+    def __init__(self, daemon, name):
+        self.daemon = daemon
+        self.name = name
+
+    def disconnect(self, container):
+        self.daemon.call("disconnect", container.name)
+
+    def connect(self, container):
+        self.daemon.call("connect", container.name)
+
+
+class FakeDockerClient:
+    """A stand-in for docker.DockerClient whose calls block like a slow daemon."""
+
+    def __init__(self, names, not_found):
+        self.names = set(names)
+        self.not_found = not_found
+        self.calls = []
+        self._lock = threading.Lock()
+        self.containers = self
+        self.networks = self
+
+    def call(self, operation, name):
+        time.sleep(DAEMON_LATENCY_SECONDS)
+        with self._lock:
+            self.calls.append((operation, name))
+
+    def get(self, name):
+        self.call("get", name)
+        if name.endswith("_default"):
+            return FakeNetwork(self, name)
+        if name not in self.names:
+            raise self.not_found(name)
+        return FakeContainer(self, name)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(scope="module")
+def docker_utils():
+    pytest.importorskip("docker")
+    pytest.importorskip("prometheus_client")
+    sys.path.insert(0, ENTROPY_ENGINE_DIR)
+    from core import docker_utils
+    yield docker_utils
+    sys.path.remove(ENTROPY_ENGINE_DIR)
+
+
+def make_controller(docker_utils, names):
+    client = FakeDockerClient(names, docker_utils.NotFound)
+    controller = docker_utils.DockerController(client_factory=lambda: client, max_workers=8)
+    return controller, client
+
+
+def test_event_loop_stays_responsive_during_docker_calls(docker_utils):
+    """Measures the worst event-loop stall while a slow daemon handles a batch operation."""
+    names = [f"service-{i}" for i in range(4)]
+    controller, client = make_controller(docker_utils, names)
+
+    async def scenario():
+        stalls = []
+        done = asyncio.Event()
+
+        async def heartbeat():
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                stalls.append(time.perf_counter() - start - 0.01)
+
+        beat = asyncio.create_task(heartbeat())
+        start = time.perf_counter()
+        results = await controller.perform_many(names, "set_resources", {"mem_limit": "64m", "cpu_shares": 128})
+        elapsed = time.perf_counter() - start
+        done.set()
+        await beat
+        return results, elapsed, max(stalls)
+
+    results, elapsed, worst_stall = asyncio.run(scenario())
+    controller.close()
+    print(f"batch of {len(names)}: {elapsed * 1000:.0f}ms, worst loop stall {worst_stall * 1000:.1f}ms")
+    assert all(result["status"] == "ok" for result in results.values())
+    assert worst_stall < DAEMON_LATENCY_SECONDS / 2
+    # One lookup and one update per container, run concurrently rather than in sequence
+    assert elapsed < DAEMON_LATENCY_SECONDS * 2 * len(names) / 2
+
+
+def test_handles_are_cached_and_missing_containers_reported(docker_utils):
+    """Repeated actions reuse container and network handles; unknown containers are reported, not raised."""
+    controller, client = make_controller(docker_utils, ["ecommerce-api"])
+
+    async def scenario():
+        await controller.perform("ecommerce-api", "disconnect_network")
+        await controller.perform("ecommerce-api", "connect_network")
+        return await controller.perform_many(["ecommerce-api", "missing-api"], "stop")
+
+    results = asyncio.run(scenario())
+    controller.close()
+    lookups = [call for call in client.calls if call[0] == "get"]
+    assert results == {"ecommerce-api": {"status": "ok"}, "missing-api": {"status": "not_found"}}
+    # ecommerce-api, the network and missing-api are each looked up once
+    assert len(lookups) == 3
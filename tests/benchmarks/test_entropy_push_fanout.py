@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+ENTROPY_ENGINE_DIR = os.path.join(ROOT_DIR, "entropy-engine")
+PAYMENT_API_DIR = os.path.join(ROOT_DIR, "services", "payment-api")
+
+REDIS_URL = os.environ.get("ENTROPY_PUSH_URL", "redis://localhost:6379/2")
+REPLICAS = int(os.environ.get("ENTROPY_PUSH_REPLICAS", "200"))
+PROPAGATION_BUDGET_SECONDS = float(os.environ.get("ENTROPY_PUSH_BUDGET_SECONDS", "0.5"))
+
+
+@pytest.fixture(scope="module")
+def modules():
+    aioredis = pytest.importorskip("redis.asyncio")
+    pytest.importorskip("structlog")
+    pytest.importorskip("prometheus_client")
+    sys.path[:0] = [ENTROPY_ENGINE_DIR, PAYMENT_API_DIR]
+    from core.distribution import EntropyPublisher
+    from entropy_channel import EntropySubscriber
+    yield aioredis, EntropyPublisher, EntropySubscriber
+    del sys.path[:2]
+
+
+def test_push_reaches_all_replicas(modules):
+    """Measures how long one published change takes to be applied by every replica."""
+    aioredis, EntropyPublisher, EntropySubscriber = modules
+
+    async def scenario():
+        probe = aioredis.Redis.from_url(REDIS_URL)
+        try:
+            await probe.ping()
+        except Exception as e:
+            pytest.skip(f"Redis not reachable at {REDIS_URL}: {e}")
+        finally:
+            await probe.aclose()
+
+        applied_at = {}
+        everyone_applied = asyncio.Event()
+        service_id = f"fanout-benchmark-{time.time_ns()}"
+
+        def make_apply(replica):
+            def apply(state):
+                if state.get("latency") == 0.5:
+                    applied_at[replica] = time.perf_counter()
+                    if len(applied_at) == REPLICAS:
+                        everyone_applied.set()
+            return apply
+
+        subscribers = [
+            EntropySubscriber(aioredis.Redis.from_url(REDIS_URL), service_id, make_apply(i))
+            for i in range(REPLICAS)
+        ]
+        publisher = EntropyPublisher(aioredis.Redis.from_url(REDIS_URL))
+        try:
+            for subscriber in subscribers:
+                subscriber.start()
+            # Let every replica subscribe before publishing
+            await asyncio.sleep(1.0)
+
+            start = time.perf_counter()
+            await publisher.publish(service_id, {"latency": 0.5, "error_rate": 0})
+            await asyncio.wait_for(everyone_applied.wait(), timeout=10)
+            return max(applied_at.values()) - start
+        finally:
+            await asyncio.gather(*(subscriber.stop() for subscriber in subscribers))
+            await publisher.client.delete(f"entropy:config:{service_id}", f"entropy:config:{service_id}:version")
+            await publisher.close()
+
+    propagation = asyncio.run(scenario())
+    print(f"{REPLICAS} replicas applied the change within {propagation * 1000:.1f}ms")
+    assert propagation < PROPAGATION_BUDGET_SECONDS
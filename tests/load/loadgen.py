@@ -0,0 +1,282 @@
+"""
+Open-model HTTP load generator.
+
+Requests are sent on a fixed arrival schedule (constant rate, or stepped
+stages like k6's) no matter how slowly the target answers, so a struggling
+service sees the queue build up instead of the generator backing off.
+
+Latency is recorded twice per request: `service_time` from the moment the
+request was actually sent, and `response_time` from the moment it was
+scheduled to be sent. The latter includes any time the request spent waiting
+for a free connection, which corrects for coordinated omission: a stall in
+the target shows up in every request it delayed, not just the one that was in
+flight.
+
+    python loadgen.py --target http://localhost:8000 --rate 50 --duration 60
+    python loadgen.py --stages 30s:20,90s:10,20s:0 --route "GET /products=6" \\
+        --route "POST /checkout=1" --format prometheus --output results.prom
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+DEFAULT_ROUTES = ["GET /products=6", "POST /cart/add=3", "POST /checkout=1"]
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """
+    A sparse log-linear histogram of latencies in microseconds, in the style of HdrHistogram.
+
+    Values below 2**`precision_bits` microseconds are counted exactly; larger
+    values land in buckets whose width is at most 1/2**(`precision_bits` - 1)
+    of their value, so percentiles are accurate to that relative error
+    regardless of how large the latencies get.
+    """
+
+    def __init__(self, precision_bits: int = 8):
+        self.precision_bits = precision_bits
+        self.counts: Dict[Tuple[int, int], int] = {}
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    def _bucket(self, value_us: int) -> Tuple[int, int]:
+        shift = max(value_us.bit_length() - self.precision_bits, 0)
+        return shift, value_us >> shift
+
+    def record(self, seconds: float, count: int = 1) -> None:
+        value_us = max(int(seconds * 1_000_000), 0)
+        bucket = self._bucket(value_us)
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += count
+        self.sum_us += value_us * count
+        self.max_us = max(self.max_us, value_us)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, percentile: float) -> float:
+        """Returns the latency in seconds at or below which `percentile`% of values fall."""
+        if self.total == 0:
+            return 0.0
+        rank = max(math.ceil(self.total * percentile / 100), 1)
+        seen = 0
+        for shift, sub_bucket in sorted(self.counts, key=lambda b: b[1] << b[0]):
+            seen += self.counts[(shift, sub_bucket)]
+            if seen >= rank:
+                # Report the bucket's upper edge, never more than the true maximum
+                upper_us = ((sub_bucket + 1) << shift) - 1
+                return min(upper_us, self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def summary(self) -> Dict[str, float]:
+        summary = {f"p{p:g}": round(self.percentile(p), 6) for p in PERCENTILES}
+        summary["max"] = self.max_us / 1_000_000
+        summary["mean"] = round(self.sum_us / self.total / 1_000_000, 6) if self.total else 0.0
+        return summary
+
+
+class RouteStats:
+    def __init__(self):
+        self.response_time = LatencyHistogram()
+        self.service_time = LatencyHistogram()
+        self.statuses: Dict[str, int] = {}
+
+    def merge(self, other: "RouteStats") -> None:
+        self.response_time.merge(other.response_time)
+        self.service_time.merge(other.service_time)
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+
+def parse_duration(text: str) -> float:
+    """Parses durations like "90", "90s", "1m30s" or "2m" into seconds."""
+    seconds, number = 0.0, ""
+    for char in text.strip():
+        if char.isdigit() or char == ".":
+            number += char
+        elif char in "hms" and number:
+            seconds += float(number) * {"h": 3600, "m": 60, "s": 1}[char]
+            number = ""
+        else:
+            raise argparse.ArgumentTypeError(f"Invalid duration: {text}")
+    return seconds + float(number or 0)
+
+
+def parse_stages(text: str) -> List[Tuple[float, float]]:
+    """Parses "30s:20,1m30s:10" into (duration seconds, requests per second) stages."""
+    stages = []
+    for stage in text.split(","):
+        duration, _, rate = stage.partition(":")
+        stages.append((parse_duration(duration), float(rate)))
+    return stages
+
+
+def parse_route(text: str) -> Tuple[str, str, float]:
+    """Parses "POST /checkout=2" into (method, path, weight)."""
+    route, _, weight = text.partition("=")
+    method, _, path = route.strip().partition(" ")
+    if not path:
+        raise argparse.ArgumentTypeError(f"Invalid route: {text}")
+    return method.upper(), path.strip(), float(weight or 1)
+
+
+def arrival_times(stages: List[Tuple[float, float]], poisson: bool, rng: random.Random):
+    """Yields the offsets, in seconds from the start, at which requests should be sent."""
+    stage_start = 0.0
+    for duration, rate in stages:
+        stage_end = stage_start + duration
+        if rate > 0:
+            t = stage_start
+            while True:
+                t += rng.expovariate(rate) if poisson else 1 / rate
+                if t >= stage_end:
+                    break
+                yield t
+        stage_start = stage_end
+
+
+async def send(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    stats: RouteStats,
+    method: str,
+    path: str,
+    intended_start: float,
+    timeout: float,
+) -> None:
+    async with semaphore:
+        sent_at = time.perf_counter()
+        try:
+            response = await client.request(method, path, timeout=timeout)
+            status = str(response.status_code)
+        except httpx.TimeoutException:
+            status = "timeout"
+        except httpx.RequestError:
+            status = "error"
+        finished_at = time.perf_counter()
+    stats.service_time.record(finished_at - sent_at)
+    stats.response_time.record(finished_at - intended_start)
+    stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+
+async def run(args) -> Dict:
+    stages = parse_stages(args.stages) if args.stages else [(args.duration, args.rate)]
+    routes = [parse_route(route) for route in (args.route or DEFAULT_ROUTES)]
+    weights = [weight for _, _, weight in routes]
+    rng = random.Random(args.seed)
+    stats = {f"{method} {path}": RouteStats() for method, path, _ in routes}
+
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    # One slot per connection, so waiting for a connection happens here where
+    # it counts towards response_time but not service_time
+    semaphore = asyncio.Semaphore(args.connections)
+    tasks = set()
+    late = 0
+
+    async with httpx.AsyncClient(base_url=args.target, limits=limits) as client:
+        start = time.perf_counter()
+        for offset in arrival_times(stages, args.arrival == "poisson", rng):
+            intended_start = start + offset
+            delay = intended_start - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay < -0.001:
+                late += 1
+            method, path, _ = rng.choices(routes, weights)[0]
+            task = asyncio.create_task(
+                send(client, semaphore, stats[f"{method} {path}"], method, path, intended_start, args.timeout)
+            )
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        elapsed = time.perf_counter() - start
+
+    overall = RouteStats()
+    for route_stats in stats.values():
+        overall.merge(route_stats)
+    return {
+        "target": args.target,
+        "stages": [{"duration_seconds": d, "rate": r} for d, r in stages],
+        "arrival": args.arrival,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": overall.response_time.total,
+        "achieved_rate": round(overall.response_time.total / elapsed, 2) if elapsed else 0.0,
+        "late_sends": late,
+        "overall": report(overall),
+        "routes": {route: report(route_stats) for route, route_stats in stats.items()},
+    }
+
+
+def report(stats: RouteStats) -> Dict:
+    return {
+        "statuses": dict(sorted(stats.statuses.items())),
+        "response_time_seconds": stats.response_time.summary(),
+        "service_time_seconds": stats.service_time.summary(),
+    }
+
+
+def to_prometheus(results: Dict) -> str:
+    """Renders the results in the Prometheus text exposition format, e.g. for a textfile collector."""
+    lines = [
+        "# HELP loadgen_requests_total Requests sent by the load generator",
+        "# TYPE loadgen_requests_total counter",
+    ]
+    for route, route_report in results["routes"].items():
+        for status, count in route_report["statuses"].items():
+            lines.append(f'loadgen_requests_total{{route="{route}",status="{status}"}} {count}')
+    lines += [
+        "# HELP loadgen_latency_seconds Latency percentiles; response_time is measured from the scheduled send time",
+        "# TYPE loadgen_latency_seconds gauge",
+    ]
+    for route, route_report in [("all", results["overall"]), *results["routes"].items()]:
+        for kind in ("response_time", "service_time"):
+            for quantile, value in route_report[f"{kind}_seconds"].items():
+                lines.append(f'loadgen_latency_seconds{{route="{route}",kind="{kind}",quantile="{quantile}"}} {value}')
+    lines += [
+        "# HELP loadgen_achieved_rate Requests per second actually sent",
+        "# TYPE loadgen_achieved_rate gauge",
+        f"loadgen_achieved_rate {results['achieved_rate']}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="http://localhost:8000", help="Base URL of the service under test")
+    parser.add_argument("--rate", type=float, default=20.0, help="Requests per second for a constant-rate run")
+    parser.add_argument("--duration", type=parse_duration, default=60.0, help="Length of a constant-rate run")
+    parser.add_argument("--stages", help='Stepped rates instead of --rate/--duration, e.g. "30s:20,1m30s:10"')
+    parser.add_argument("--arrival", choices=("uniform", "poisson"), default="poisson")
+    parser.add_argument("--route", action="append", help='Weighted route, e.g. "GET /products=6"; repeatable')
+    parser.add_argument("--connections", type=int, default=100, help="Maximum open connections, and so requests in flight")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, help="Seed for arrival times and route choice")
+    parser.add_argument("--format", choices=("json", "prometheus"), default="json")
+    parser.add_argument("--output", help="Write results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    rendered = json.dumps(results, indent=2) + "\n" if args.format == "json" else to_prometheus(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(rendered)
+    else:
+        sys.stdout.write(rendered)
+
+
+if __name__ == "__main__":
+    main()